@@ -0,0 +1,58 @@
+"""
+退避重试工具模块
+
+提供带抖动的指数退避（full jitter）计算和基于调用截止时间的剩余时间判断，
+供转发和幂等性写入的重试共用。
+"""
+import random
+import time
+from typing import Any, Optional
+
+
+def full_jitter_delay(attempt: int, base: float, cap: float) -> float:
+    """
+    计算第 attempt 次重试前的等待时间。
+
+    等待时间在 [0, min(cap, base * 2^attempt)] 内均匀随机，避免多个调用
+    同时重试造成新的拥塞。
+
+    Args:
+        attempt: 已重试次数（从 0 开始）
+        base: 退避基数（秒）
+        cap: 退避上限（秒）
+
+    Returns:
+        float: 等待时间（秒）
+    """
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def invocation_deadline(context: Any, reserve: float = 0.0) -> Optional[float]:
+    """
+    根据 Lambda 上下文计算本次调用的截止时间（time.monotonic 时间）。
+
+    Args:
+        context: Lambda 运行时上下文（本地调用时可能为 None）
+        reserve: 为截止时间之后的收尾工作预留的时间（秒）
+
+    Returns:
+        float: 截止时间，无法获取剩余时间时返回 None（不限制）
+    """
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if get_remaining is None:
+        return None
+    return time.monotonic() + get_remaining() / 1000 - reserve
+
+
+def can_wait(deadline: Optional[float], delay: float) -> bool:
+    """
+    判断等待 delay 秒后是否仍在截止时间之前。
+
+    Args:
+        deadline: 截止时间（time.monotonic 时间，None 表示不限制）
+        delay: 等待时间（秒）
+
+    Returns:
+        bool: True 表示可以等待后重试
+    """
+    return deadline is None or time.monotonic() + delay < deadline
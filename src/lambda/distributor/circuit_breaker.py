@@ -0,0 +1,200 @@
+"""
+熔断器模块
+
+为每个 Region 维护一个熔断器，由队列属性查询和消息发送的结果共同驱动：
+- closed: 正常路由；任一信号连续失败达到阈值后打开
+- open: 不参与路由；经过 reset_timeout 秒后进入半开
+- half_open: 只接收少量探测流量；探测成功后关闭，失败后重新打开
+
+两种信号分别计数：队列属性查询成功只重置属性查询的失败计数，不会掩盖消息发送的
+连续失败；只有消息发送（探测流量）的结果能让熔断器离开 open / half_open 状态。
+
+本模块不依赖 AWS SDK，可在本地基准测试中直接使用。
+"""
+import time
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+# 熔断器信号
+SIGNAL_SEND = "send"              # 消息发送
+SIGNAL_ATTRIBUTES = "attributes"  # 队列属性查询
+SIGNALS = (SIGNAL_SEND, SIGNAL_ATTRIBUTES)
+
+
+class CircuitBreaker:
+    """单个 Region 的熔断器（非线程安全，由 RegionCircuitBreakers 加锁访问）"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 打开熔断器所需的连续失败次数
+            reset_timeout: 打开后进入半开状态前的等待时间（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures: Dict[str, int] = {signal: 0 for signal in SIGNALS}
+        self.opened_at: Optional[float] = None
+        self.probe_started_at: Optional[float] = None
+
+    def state(self, now: float) -> str:
+        """返回当前状态"""
+        if self.opened_at is None:
+            return STATE_CLOSED
+        if now - self.opened_at < self.reset_timeout:
+            return STATE_OPEN
+        return STATE_HALF_OPEN
+
+    def record_success(self, signal: str = SIGNAL_SEND) -> None:
+        """
+        记录一次成功：重置该信号的失败计数。
+
+        消息发送成功时关闭熔断器并重置全部计数；队列属性查询成功不改变状态。
+        """
+        if signal != SIGNAL_SEND:
+            self.consecutive_failures[signal] = 0
+            return
+
+        self.consecutive_failures = {name: 0 for name in SIGNALS}
+        self.opened_at = None
+        self.probe_started_at = None
+
+    def record_failure(self, now: float, signal: str = SIGNAL_SEND) -> None:
+        """
+        记录一次失败：关闭状态下该信号达到阈值后打开；
+        半开状态下只有消息发送（探测）失败才重新打开。
+        """
+        self.consecutive_failures[signal] += 1
+
+        state = self.state(now)
+        if signal == SIGNAL_SEND:
+            self.probe_started_at = None
+            if state == STATE_HALF_OPEN:
+                self.opened_at = now
+        if (
+            state == STATE_CLOSED
+            and self.consecutive_failures[signal] >= self.failure_threshold
+        ):
+            self.opened_at = now
+
+    def try_acquire_probe(self, now: float) -> bool:
+        """
+        半开状态下尝试获取探测名额（同一时间只有一批探测流量）。
+
+        探测结果迟迟未记录时（如调用异常退出），reset_timeout 秒后允许新的探测。
+        """
+        if self.state(now) != STATE_HALF_OPEN:
+            return False
+        if self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout:
+            return False
+        self.probe_started_at = now
+        return True
+
+
+class RegionCircuitBreakers:
+    """按 Region 管理熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化熔断器集合
+
+        Args:
+            failure_threshold: 打开熔断器所需的连续失败次数
+            reset_timeout: 打开后进入半开状态前的等待时间（秒）
+            clock: 时间函数（模拟时可替换）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def _breaker(self, region: str) -> CircuitBreaker:
+        breaker = self._breakers.get(region)
+        if breaker is None:
+            breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self._breakers[region] = breaker
+        return breaker
+
+    def record_success(self, region: str, signal: str = SIGNAL_SEND) -> None:
+        """
+        记录 Region 的一次成功调用。
+
+        Args:
+            region: Region
+            signal: SIGNAL_SEND / SIGNAL_ATTRIBUTES
+        """
+        with self._lock:
+            breaker = self._breaker(region)
+            previous = breaker.state(self.clock())
+            breaker.record_success(signal)
+
+        if previous != STATE_CLOSED:
+            logger.info("Region %s 熔断器关闭（%s -> closed）", region, previous)
+
+    def record_failure(self, region: str, signal: str = SIGNAL_SEND) -> bool:
+        """
+        记录 Region 的一次失败调用。
+
+        Args:
+            region: Region
+            signal: SIGNAL_SEND / SIGNAL_ATTRIBUTES
+
+        Returns:
+            bool: True 表示熔断器因本次失败而打开
+        """
+        with self._lock:
+            now = self.clock()
+            breaker = self._breaker(region)
+            previous = breaker.state(now)
+            breaker.record_failure(now, signal)
+            opened = previous != STATE_OPEN and breaker.state(now) == STATE_OPEN
+
+        if opened:
+            logger.warning(
+                "Region %s 熔断器打开（%s -> open），%s 秒后允许探测",
+                region, previous, self.reset_timeout
+            )
+        return opened
+
+    def state(self, region: str) -> str:
+        """
+        获取 Region 的熔断器状态。
+
+        Args:
+            region: Region
+
+        Returns:
+            str: STATE_CLOSED / STATE_OPEN / STATE_HALF_OPEN
+        """
+        with self._lock:
+            breaker = self._breakers.get(region)
+            return breaker.state(self.clock()) if breaker else STATE_CLOSED
+
+    def try_acquire_probe(self, region: str) -> bool:
+        """
+        为半开状态的 Region 获取探测名额。
+
+        Args:
+            region: Region
+
+        Returns:
+            bool: True 表示本批可以向该 Region 发送探测流量
+        """
+        with self._lock:
+            breaker = self._breakers.get(region)
+            return breaker.try_acquire_probe(self.clock()) if breaker else False
@@ -14,29 +14,125 @@ class Config:
     def __init__(self):
         # 缓存配置
         self.cache_ttl = int(os.environ.get("CACHE_TTL", "60"))  # 秒
+        # 缓存最大陈旧时间（秒），大于 cache_ttl 时启用 stale-while-revalidate
+        self.cache_max_staleness = int(
+            os.environ.get("CACHE_MAX_STALENESS", "0")
+        )
+
+        # 单次刷新中查询队列属性的超时时间（秒）
+        self.queue_attributes_timeout = float(
+            os.environ.get("QUEUE_ATTRIBUTES_TIMEOUT", "2")
+        )
 
         # 队列配置
         self.max_queue_depth_threshold = int(
             os.environ.get("MAX_QUEUE_DEPTH_THRESHOLD", "5000")
         )
 
+        # 转发配置（并发发送 SendMessageBatch 的最大线程数）
+        self.forward_max_concurrency = int(
+            os.environ.get("FORWARD_MAX_CONCURRENCY", "8")
+        )
+        # SendMessageBatch 单次请求的消息体总字节数上限
+        self.sqs_max_batch_bytes = int(
+            os.environ.get("SQS_MAX_BATCH_BYTES", "262144")
+        )
+        # SendMessageBatch 失败条目的最大重试次数
+        self.forward_max_retries = int(os.environ.get("FORWARD_MAX_RETRIES", "3"))
+        # SQS 调用的连接和读取超时（秒）及 SDK 的最大尝试次数
+        self.sqs_call_timeout = float(os.environ.get("SQS_CALL_TIMEOUT", "5"))
+        self.sqs_max_attempts = int(os.environ.get("SQS_MAX_ATTEMPTS", "2"))
+        # 为确认阶段预留的调用剩余时间（秒），不足时不再处理新的消息；
+        # 未配置时按 SQS 和 DynamoDB 调用的超时和尝试次数计算（见 handler）
+        reserve = os.environ.get("INVOCATION_TIME_RESERVE")
+        self.invocation_time_reserve = float(reserve) if reserve else None
+        # 各 Region 熔断器：连续失败阈值、打开后进入半开的时间（秒）、半开时探测流量比例
+        self.circuit_failure_threshold = int(
+            os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "3")
+        )
+        self.circuit_reset_timeout = float(
+            os.environ.get("CIRCUIT_RESET_TIMEOUT", "30")
+        )
+        self.circuit_probe_share = float(os.environ.get("CIRCUIT_PROBE_SHARE", "0.1"))
+
+        # 路由策略: inverse_weight / least_loaded / power_of_two / weighted_round_robin
+        self.routing_strategy = os.environ.get("ROUTING_STRATEGY", "inverse_weight")
+
+        # 路由代价: depth（按积压深度）/ drain_time（按估算排空时间）
+        self.routing_cost = os.environ.get("ROUTING_COST", "depth")
+        # 消费速率的平滑系数（0~1）
+        self.drain_rate_smoothing = float(
+            os.environ.get("DRAIN_RATE_SMOOTHING", "0.3")
+        )
+
+        # 计算权重时是否叠加本容器自上次刷新以来路由的消息数
+        self.routed_load_accounting = (
+            os.environ.get("ROUTED_LOAD_ACCOUNTING", "true").lower() == "true"
+        )
+
+        # 是否手动调用 DeleteMessageBatch 删除主队列消息（默认使用部分批处理响应）
+        self.manual_delete_enabled = (
+            os.environ.get("MANUAL_DELETE_ENABLED", "false").lower() == "true"
+        )
+
         # DynamoDB 配置
         self.idempotency_table_name = os.environ.get(
             "IDEMPOTENCY_TABLE_NAME", "inference-idempotency"
         )
 
+        # 共享队列负载快照表（为空时每个容器各自查询 SQS）
+        self.load_snapshot_table_name = os.environ.get("LOAD_SNAPSHOT_TABLE_NAME", "")
+
         # TTL 配置 (7 天)
         self.idempotency_ttl_days = int(
             os.environ.get("IDEMPOTENCY_TTL_DAYS", "7")
         )
 
+        # 处理中认领的租约（秒），需大于 Lambda 超时并小于主队列可见性超时
+        self.idempotency_lease_seconds = int(
+            os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "360")
+        )
+
+        # 消息体指纹算法（none / crc32 / sha256）
+        self.idempotency_body_hash = os.environ.get("IDEMPOTENCY_BODY_HASH", "sha256")
+
+        # 新写入的幂等性记录格式（legacy / compact）
+        self.idempotency_record_format = os.environ.get(
+            "IDEMPOTENCY_RECORD_FORMAT", "legacy"
+        )
+
+        # DynamoDB 调用的连接和读取超时（秒）及 SDK 的最大尝试次数
+        self.dynamodb_call_timeout = float(
+            os.environ.get("DYNAMODB_CALL_TIMEOUT", "2")
+        )
+        self.dynamodb_max_attempts = int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", "3"))
+        # 限流错误的应用层重试次数
+        self.idempotency_throttle_retries = int(
+            os.environ.get("IDEMPOTENCY_THROTTLE_RETRIES", "3")
+        )
+
+        # 本容器幂等性 LRU 缓存（条目上限为 0 时关闭）
+        self.idempotency_cache_max_entries = int(
+            os.environ.get("IDEMPOTENCY_CACHE_MAX_ENTRIES", "10000")
+        )
+        self.idempotency_cache_ttl = int(
+            os.environ.get("IDEMPOTENCY_CACHE_TTL", "300")
+        )
+
         # Region 队列映射
         # 格式: {"us-east-1": "https://sqs.us-east-1.amazonaws.com/xxx/queue"}
         region_queues_str = os.environ.get("REGION_QUEUES", "{}")
         self.region_queues = json.loads(region_queues_str)
 
+        # 自定义指标命名空间（EMF）
+        self.metrics_namespace = os.environ.get(
+            "METRICS_NAMESPACE", "InferenceOrchestrator"
+        )
+
         # 日志级别
         self.log_level = os.environ.get("LOG_LEVEL", "INFO")
+        # 以 INFO 级别输出逐条消息日志的调用比例（0 表示只在 DEBUG 级别输出）
+        self.log_sample_rate = float(os.environ.get("LOG_SAMPLE_RATE", "0"))
 
     def validate(self) -> None:
         """验证配置参数的有效性"""
@@ -46,23 +142,169 @@ class Config:
         if self.cache_ttl <= 0:
             raise ValueError(f"CACHE_TTL 必须大于 0，当前值: {self.cache_ttl}")
 
+        if self.cache_max_staleness < 0:
+            raise ValueError(
+                f"CACHE_MAX_STALENESS 不能为负数，当前值: {self.cache_max_staleness}"
+            )
+
+        if self.queue_attributes_timeout <= 0:
+            raise ValueError(
+                f"QUEUE_ATTRIBUTES_TIMEOUT 必须大于 0，当前值: {self.queue_attributes_timeout}"
+            )
+
         if self.max_queue_depth_threshold <= 0:
             raise ValueError(
                 f"MAX_QUEUE_DEPTH_THRESHOLD 必须大于 0，当前值: {self.max_queue_depth_threshold}"
             )
 
+        if self.routing_strategy not in (
+            "inverse_weight", "least_loaded", "power_of_two", "weighted_round_robin"
+        ):
+            raise ValueError(f"ROUTING_STRATEGY 无效，当前值: {self.routing_strategy}")
+
+        if self.routing_cost not in ("depth", "drain_time"):
+            raise ValueError(f"ROUTING_COST 无效，当前值: {self.routing_cost}")
+
+        # 估算消费速率需要全体容器路由进入各 Region 的消息数，只有共享快照提供；
+        # 只用本容器的路由数会让本容器偏好的 Region 看起来消费更快，形成正反馈
+        if self.routing_cost == "drain_time" and not self.load_snapshot_table_name:
+            raise ValueError(
+                "ROUTING_COST=drain_time 需要配置 LOAD_SNAPSHOT_TABLE_NAME"
+                "（消费速率按全体容器的到达量估算）"
+            )
+
+        if not 0 < self.drain_rate_smoothing <= 1:
+            raise ValueError(
+                f"DRAIN_RATE_SMOOTHING 必须在 (0, 1] 范围内，当前值: {self.drain_rate_smoothing}"
+            )
+
+        if self.forward_max_concurrency <= 0:
+            raise ValueError(
+                f"FORWARD_MAX_CONCURRENCY 必须大于 0，当前值: {self.forward_max_concurrency}"
+            )
+
+        if self.sqs_max_batch_bytes <= 0:
+            raise ValueError(
+                f"SQS_MAX_BATCH_BYTES 必须大于 0，当前值: {self.sqs_max_batch_bytes}"
+            )
+
+        if self.forward_max_retries < 0:
+            raise ValueError(
+                f"FORWARD_MAX_RETRIES 不能为负数，当前值: {self.forward_max_retries}"
+            )
+
+        if self.sqs_call_timeout <= 0:
+            raise ValueError(
+                f"SQS_CALL_TIMEOUT 必须大于 0，当前值: {self.sqs_call_timeout}"
+            )
+
+        if self.sqs_max_attempts <= 0:
+            raise ValueError(
+                f"SQS_MAX_ATTEMPTS 必须大于 0，当前值: {self.sqs_max_attempts}"
+            )
+
+        if self.invocation_time_reserve is not None and self.invocation_time_reserve < 0:
+            raise ValueError(
+                f"INVOCATION_TIME_RESERVE 不能为负数，当前值: {self.invocation_time_reserve}"
+            )
+
+        if self.circuit_failure_threshold <= 0:
+            raise ValueError(
+                f"CIRCUIT_FAILURE_THRESHOLD 必须大于 0，当前值: {self.circuit_failure_threshold}"
+            )
+
+        if self.circuit_reset_timeout < 0:
+            raise ValueError(
+                f"CIRCUIT_RESET_TIMEOUT 不能为负数，当前值: {self.circuit_reset_timeout}"
+            )
+
+        if not 0 < self.circuit_probe_share <= 1:
+            raise ValueError(
+                f"CIRCUIT_PROBE_SHARE 必须在 (0, 1] 范围内，当前值: {self.circuit_probe_share}"
+            )
+
+        if self.idempotency_cache_max_entries < 0:
+            raise ValueError(
+                f"IDEMPOTENCY_CACHE_MAX_ENTRIES 不能为负数，当前值: {self.idempotency_cache_max_entries}"
+            )
+
+        if self.idempotency_lease_seconds <= 0:
+            raise ValueError(
+                f"IDEMPOTENCY_LEASE_SECONDS 必须大于 0，当前值: {self.idempotency_lease_seconds}"
+            )
+
+        if self.idempotency_body_hash not in ("none", "crc32", "sha256"):
+            raise ValueError(
+                f"IDEMPOTENCY_BODY_HASH 无效，当前值: {self.idempotency_body_hash}"
+            )
+
+        if self.idempotency_record_format not in ("legacy", "compact"):
+            raise ValueError(
+                f"IDEMPOTENCY_RECORD_FORMAT 无效，当前值: {self.idempotency_record_format}"
+            )
+
+        if self.dynamodb_call_timeout <= 0:
+            raise ValueError(
+                f"DYNAMODB_CALL_TIMEOUT 必须大于 0，当前值: {self.dynamodb_call_timeout}"
+            )
+
+        if self.dynamodb_max_attempts <= 0:
+            raise ValueError(
+                f"DYNAMODB_MAX_ATTEMPTS 必须大于 0，当前值: {self.dynamodb_max_attempts}"
+            )
+
+        if self.idempotency_throttle_retries < 0:
+            raise ValueError(
+                f"IDEMPOTENCY_THROTTLE_RETRIES 不能为负数，当前值: {self.idempotency_throttle_retries}"
+            )
+
+        if self.idempotency_cache_ttl <= 0:
+            raise ValueError(
+                f"IDEMPOTENCY_CACHE_TTL 必须大于 0，当前值: {self.idempotency_cache_ttl}"
+            )
+
         if not self.idempotency_table_name:
             raise ValueError("IDEMPOTENCY_TABLE_NAME 不能为空")
 
+        if self.log_level.upper() not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+            raise ValueError(f"LOG_LEVEL 无效，当前值: {self.log_level}")
+
+        if not 0 <= self.log_sample_rate <= 1:
+            raise ValueError(
+                f"LOG_SAMPLE_RATE 必须在 [0, 1] 范围内，当前值: {self.log_sample_rate}"
+            )
+
     def __repr__(self) -> str:
         """返回配置的字符串表示（隐藏敏感信息）"""
         return (
             f"Config("
             f"cache_ttl={self.cache_ttl}, "
+            f"cache_max_staleness={self.cache_max_staleness}, "
+            f"queue_attributes_timeout={self.queue_attributes_timeout}, "
             f"max_queue_depth_threshold={self.max_queue_depth_threshold}, "
+            f"routing_strategy={self.routing_strategy}, "
+            f"routing_cost={self.routing_cost}, "
+            f"routed_load_accounting={self.routed_load_accounting}, "
+            f"forward_max_concurrency={self.forward_max_concurrency}, "
+            f"forward_max_retries={self.forward_max_retries}, "
+            f"sqs_max_batch_bytes={self.sqs_max_batch_bytes}, "
+            f"sqs_call_timeout={self.sqs_call_timeout}, "
+            f"sqs_max_attempts={self.sqs_max_attempts}, "
+            f"invocation_time_reserve={self.invocation_time_reserve}, "
+            f"circuit_failure_threshold={self.circuit_failure_threshold}, "
+            f"circuit_reset_timeout={self.circuit_reset_timeout}, "
+            f"manual_delete_enabled={self.manual_delete_enabled}, "
             f"idempotency_table_name={self.idempotency_table_name}, "
+            f"idempotency_lease_seconds={self.idempotency_lease_seconds}, "
+            f"idempotency_body_hash={self.idempotency_body_hash}, "
+            f"idempotency_record_format={self.idempotency_record_format}, "
+            f"dynamodb_call_timeout={self.dynamodb_call_timeout}, "
+            f"dynamodb_max_attempts={self.dynamodb_max_attempts}, "
+            f"idempotency_cache_max_entries={self.idempotency_cache_max_entries}, "
+            f"load_snapshot_table_name={self.load_snapshot_table_name or None}, "
             f"region_queues_count={len(self.region_queues)}, "
-            f"log_level={self.log_level}"
+            f"log_level={self.log_level}, "
+            f"log_sample_rate={self.log_sample_rate}"
             f")"
         )
 
@@ -5,136 +5,534 @@ Lambda 函数入口模块
 """
 import json
 import logging
-from typing import Dict, List, Any
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Tuple
 import boto3
 
-from idempotency import check_and_record_message
-from queue_selector import get_target_queue_url, sqs_client
-
-# 配置日志
+from backoff import can_wait, full_jitter_delay, invocation_deadline
+from config import config
+from idempotency import (
+    body_fingerprint,
+    check_and_record_messages,
+    CLAIM_CONFLICT,
+    CLAIM_DUPLICATE,
+    CLAIM_ERROR,
+    CLAIM_IN_PROGRESS,
+    DYNAMODB_CALL_TIMEOUT,
+    DYNAMODB_MAX_ATTEMPTS,
+    get_cache_stats,
+    mark_messages_completed,
+    new_claim_token,
+    release_message_claims,
+)
+from log_sampling import log_record, start_invocation
+from metrics import put_metrics, take_invocation_metrics
+from queue_selector import (
+    get_target_queue_urls,
+    record_region_failure,
+    record_region_success,
+    record_routed,
+    SQS_CALL_TIMEOUT,
+    SQS_MAX_ATTEMPTS,
+    sqs_client,
+)
+
+# 冷启动时校验配置，配置无效时初始化直接失败，而不是在处理消息时才暴露
+config.validate()
+
+# 配置日志（根日志记录器的级别同时作用于其他模块的日志）
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+logger.setLevel(config.log_level.upper())
+
+# 并发转发和认领的最大线程数（设为 1 时顺序执行）
+FORWARD_MAX_CONCURRENCY = int(os.environ.get("FORWARD_MAX_CONCURRENCY", "8"))
+
+# 并发转发和并发认领共用的线程池（Lambda 容器复用时保持，线程按需创建）
+_forward_executor = (
+    ThreadPoolExecutor(max_workers=FORWARD_MAX_CONCURRENCY, thread_name_prefix="forward")
+    if FORWARD_MAX_CONCURRENCY > 1 else None
+)
+
+# 每轮认领的最大消息数，轮与轮之间检查截止时间
+CLAIM_WAVE_SIZE = 100
+
+# SendMessageBatch 中失败条目（非 SenderFault）的最大重试次数
+FORWARD_MAX_RETRIES = int(os.environ.get("FORWARD_MAX_RETRIES", "3"))
+# 重试退避基数和上限（秒）
+FORWARD_RETRY_BASE_DELAY = 0.05
+FORWARD_RETRY_MAX_DELAY = 1.0
+
+# 单次 SQS / DynamoDB 调用（含 SDK 重试）最长可能持续的时间（秒）。截止时间只在
+# 发起调用前检查，截止前发起的调用最多会超出这么久
+SQS_CALL_BUDGET = SQS_CALL_TIMEOUT * SQS_MAX_ATTEMPTS
+DYNAMODB_CALL_BUDGET = DYNAMODB_CALL_TIMEOUT * DYNAMODB_MAX_ATTEMPTS
+
+# 确认阶段的 DynamoDB 写入截止后，为截止前发起的写入和返回结果预留的时间（秒）
+ACK_TIME_RESERVE = DYNAMODB_CALL_BUDGET + 0.5
+# 为确认阶段（标记完成、释放认领）和返回预留的时间（秒）。剩余时间少于该值时
+# 不再认领、路由或转发新的消息，未处理的消息报告为失败。默认覆盖截止前发起的
+# 一次发送、标记完成和释放认领各一次写入以及 ACK_TIME_RESERVE
+INVOCATION_TIME_RESERVE = float(
+    os.environ.get("INVOCATION_TIME_RESERVE")
+    or SQS_CALL_BUDGET + 2 * DYNAMODB_CALL_BUDGET + ACK_TIME_RESERVE
+)
+# 开始新一轮认领时，为截止前发起的认领写入以及已认领消息的路由和转发额外预留的时间（秒）
+CLAIM_FORWARD_BUDGET = DYNAMODB_CALL_BUDGET + SQS_CALL_BUDGET
+
+# SendMessageBatch 的条目数上限和单次请求的消息体总字节数上限
+SQS_MAX_BATCH_ENTRIES = 10
+SQS_MAX_BATCH_BYTES = int(os.environ.get("SQS_MAX_BATCH_BYTES", "262144"))
+
+# 是否手动调用 DeleteMessageBatch 删除主队列消息
+# 默认关闭：事件源映射启用 ReportBatchItemFailures，Lambda 会自动删除未报告失败的消息
+MANUAL_DELETE_ENABLED = (
+    os.environ.get("MANUAL_DELETE_ENABLED", "false").lower() == "true"
+)
+
+
+class PipelineTimer:
+    """记录 lambda_handler 各处理阶段的耗时和处理条数，并以 EMF 指标输出"""
+
+    def __init__(self):
+        self.stages: Dict[str, Tuple[float, int]] = {}
+
+    @contextmanager
+    def stage(self, name: str, items: int):
+        """
+        计时一个处理阶段
+
+        Args:
+            name: 阶段名（用作指标名前缀，如 Parse -> ParseDuration / ParseItems）
+            items: 进入该阶段的条数
+        """
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] = ((time.monotonic() - start) * 1000, items)
+
+    def emit(self, properties: Optional[Dict[str, Any]] = None) -> None:
+        """
+        输出各阶段的 <阶段>Duration / <阶段>Items 指标（一条 EMF 日志），
+        调用期间暂存的其他指标（见 metrics.add_invocation_metrics）一并输出
+
+        Args:
+            properties: 随指标写入同一条日志的其他属性（可选）
+        """
+        metrics, pending_properties = take_invocation_metrics()
+        for name, (duration, items) in self.stages.items():
+            metrics[f"{name}Duration"] = (duration, "Milliseconds")
+            metrics[f"{name}Items"] = (items, "Count")
+        put_metrics(metrics, properties={**pending_properties, **(properties or {})})
 
 
 def lambda_handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Lambda 入口函数
 
+    按批处理的流水线依次执行：解析 -> 批次内去重 -> 幂等性认领 -> 路由 ->
+    转发 -> 确认。每个阶段处理整批消息，耗时和条数以 EMF 指标输出。
+
+    认领、路由和转发阶段以本次调用的剩余时间为预算（预留 INVOCATION_TIME_RESERVE
+    秒给确认阶段，认领阶段另外为路由和转发预留 CLAIM_FORWARD_BUDGET 秒）。
+    预算耗尽时不再处理新的消息，已完成的部分正常确认，只有未处理的消息报告为
+    失败（deferred），已认领但未转发的消息在确认阶段释放认领。
+
     Args:
         event: SQS 事件，包含批量消息
         context: Lambda 运行时上下文
 
     Returns:
-        Dict: 处理结果，包含成功和失败的消息数量
+        Dict: 处理结果，包含成功和失败的消息数量，以及部分批处理响应
+            batchItemFailures（未成功处理的消息，由 SQS 重新投递）
     """
-    logger.info(f"收到 {len(event['Records'])} 条消息")
+    records = event["Records"]
+    start_invocation()
+    new_claim_token()
+    logger.debug("收到 %d 条消息", len(records))
 
     # 统计信息
     stats = {
-        "total": len(event["Records"]),
+        "total": len(records),
         "processed": 0,
         "duplicate": 0,
+        "conflict": 0,
         "failed": 0,
+        "deferred": 0,
         "success": 0,
     }
+    timer = PipelineTimer()
+    deadline = invocation_deadline(context, INVOCATION_TIME_RESERVE)
+    claim_deadline = invocation_deadline(
+        context, INVOCATION_TIME_RESERVE + CLAIM_FORWARD_BUDGET
+    )
+    ack_deadline = invocation_deadline(context, ACK_TIME_RESERVE)
+
+    # 已确认处理完成的消息（重复消息和转发成功的消息），其余报告为失败
+    acknowledged: List[Dict] = []
+
+    with timer.stage("Parse", len(records)):
+        parsed_messages = parse_records(records, stats)
+
+    # 同一 request_id 只认领和转发一次，其余副本在本地确认
+    with timer.stage("Dedupe", len(parsed_messages)):
+        unique_messages, local_duplicates, local_conflicts = collapse_duplicates(
+            parsed_messages
+        )
+        stats["duplicate"] += len(local_duplicates)
+        stats["conflict"] += len(local_conflicts)
+        stats["failed"] += len(local_conflicts)
+        acknowledged.extend(local_duplicates)
+        for msg in local_conflicts:
+            # 与首条副本消息体不同，保留消息，由 SQS 重新投递后再做判断
+            logger.error("消息 %s 与同批次内的副本消息体不同", msg["request_id"])
+
+    with timer.stage("Claim", len(unique_messages)):
+        claimed_messages, duplicates = claim_messages(
+            unique_messages, stats, claim_deadline
+        )
+        acknowledged.extend(duplicates)
+
+    with timer.stage("Route", len(claimed_messages)):
+        if can_wait(deadline, 0):
+            messages_to_forward = route_messages(claimed_messages, stats)
+        else:
+            if claimed_messages:
+                _defer(claimed_messages, stats, "路由")
+            messages_to_forward = []
+
+    # 批量转发消息到子队列（失败条目的重试不超过本次调用的剩余时间）
+    with timer.stage("Forward", len(messages_to_forward)):
+        if messages_to_forward and not can_wait(deadline, 0):
+            _defer(messages_to_forward, stats, "转发")
+        elif messages_to_forward:
+            forward_results = forward_messages_batch(messages_to_forward, deadline)
+            stats["success"] = forward_results["success"]
+            stats["failed"] += forward_results["failed"]
+            acknowledged.extend(forward_results["forwarded"])
+
+    with timer.stage("Ack", len(records)):
+        batch_item_failures = acknowledge_messages(
+            records, claimed_messages, acknowledged, ack_deadline
+        )
+
+    # 每次调用只输出一行 EMF 日志：各阶段指标，以及处理统计和缓存统计等属性
+    timer.emit({
+        "message": "invocation_summary",
+        "aws_request_id": getattr(context, "aws_request_id", None),
+        **stats,
+        "idempotency_cache": get_cache_stats(),
+    })
+    return {
+        "statusCode": 200,
+        "body": json.dumps(stats),
+        "batchItemFailures": batch_item_failures,
+    }
+
 
-    # 批量处理消息
-    messages_to_forward = []  # 待转发的消息
-    messages_to_delete = []   # 待删除的消息（成功处理的）
+def parse_records(records: List[Dict], stats: Dict[str, int]) -> List[Dict]:
+    """
+    解析阶段：解析 SQS 记录的消息体，提取 request_id 并计算消息体指纹
 
-    for record in event["Records"]:
+    Args:
+        records: SQS 事件中的记录列表
+        stats: 处理统计（无法解析的记录计入 failed）
+
+    Returns:
+        List[Dict]: 已解析的消息（request_id、message_body、fingerprint、receipt_handle）
+    """
+    parsed_messages = []
+    for record in records:
+        message_body = record.get("body")
+        receipt_handle = record.get("receiptHandle")
+        if message_body is None or receipt_handle is None:
+            logger.error("SQS 记录缺少 body 或 receiptHandle: %s", record.get("messageId"))
+            stats["failed"] += 1
+            continue
+
+        # 解析 JSON 消息体
         try:
-            # 解析消息
-            message_body = record["body"]
-            receipt_handle = record["receiptHandle"]
-
-            # 解析 JSON 消息体
-            try:
-                message_data = json.loads(message_body)
-                request_id = message_data.get("request_id")
-
-                if not request_id:
-                    logger.error(f"消息缺少 request_id: {message_body}")
-                    stats["failed"] += 1
-                    continue
+            message_data = json.loads(message_body)
+        except json.JSONDecodeError:
+            logger.error("消息 JSON 解析失败: %s", message_body)
+            stats["failed"] += 1
+            continue
+
+        request_id = (
+            message_data.get("request_id") if isinstance(message_data, dict) else None
+        )
+        if not request_id:
+            logger.error("消息缺少 request_id: %s", message_body)
+            stats["failed"] += 1
+            continue
 
-            except json.JSONDecodeError:
-                logger.error(f"消息 JSON 解析失败: {message_body}")
-                stats["failed"] += 1
-                continue
+        parsed_messages.append({
+            "request_id": request_id,
+            "message_body": message_body,
+            # 消息体指纹只计算一次，认领和标记完成时复用
+            "fingerprint": body_fingerprint(message_body),
+            "receipt_handle": receipt_handle,
+        })
 
-            # 幂等性检查
-            is_first_time = check_and_record_message(request_id, message_body)
+    return parsed_messages
 
-            if not is_first_time:
-                # 重复消息，标记为删除（避免重复处理）
-                stats["duplicate"] += 1
-                messages_to_delete.append(
-                    {"Id": request_id, "ReceiptHandle": receipt_handle}
-                )
-                continue
 
-            # 选择目标队列
-            try:
-                target_region, target_queue_url = get_target_queue_url()
-                logger.info(
-                    f"消息 {request_id} 将发送到 Region: {target_region}"
-                )
+def _defer(messages: List[Dict], stats: Dict[str, int], stage: str) -> None:
+    """剩余时间不足，跳过消息的后续处理（报告为失败，由 SQS 重新投递）"""
+    stats["deferred"] += len(messages)
+    stats["failed"] += len(messages)
+    logger.warning("剩余时间不足，%d 条消息未进入%s阶段", len(messages), stage)
 
-                messages_to_forward.append({
-                    "request_id": request_id,
-                    "message_body": message_body,
-                    "receipt_handle": receipt_handle,
-                    "target_queue_url": target_queue_url,
-                })
-                stats["processed"] += 1
 
-            except ValueError as e:
-                logger.error(f"选择目标队列失败: {str(e)}")
-                stats["failed"] += 1
-                # 不删除消息，让 SQS 自动重试
-                continue
+def claim_messages(
+    messages: List[Dict], stats: Dict[str, int], deadline: Optional[float] = None
+) -> Tuple[List[Dict], List[Dict]]:
+    """
+    认领阶段：批量幂等性检查，并在 DynamoDB 中认领首次出现的消息
+
+    消息按 CLAIM_WAVE_SIZE 条一轮认领，每轮的条件写入在线程池中并发发起。
+    超过截止时间后不再开始新的一轮，剩余消息不认领。
 
+    Args:
+        messages: 去重后的消息列表
+        stats: 处理统计
+        deadline: 截止时间（time.monotonic 时间，None 表示不限制）
+
+    Returns:
+        Tuple: (认领成功、待路由的消息列表, 已处理过的重复消息列表)
+    """
+    claim_results: List[str] = []
+    for i in range(0, len(messages), CLAIM_WAVE_SIZE):
+        if not can_wait(deadline, 0):
+            _defer(messages[i:], stats, "认领")
+            break
+
+        wave = messages[i:i + CLAIM_WAVE_SIZE]
+        try:
+            claim_results.extend(check_and_record_messages(
+                [(msg["request_id"], msg["fingerprint"]) for msg in wave],
+                deadline,
+                _forward_executor,
+            ))
         except Exception as e:
-            logger.error(f"处理消息时发生未知错误: {str(e)}", exc_info=True)
+            logger.error("批量幂等性检查失败: %s", e, exc_info=True)
+            claim_results.extend([CLAIM_ERROR] * len(wave))
+
+    claimed: List[Dict] = []
+    duplicates: List[Dict] = []
+    # zip 在已认领的消息处截止，未认领的消息已计入 deferred
+    for msg, claim_result in zip(messages, claim_results):
+        if claim_result in (CLAIM_ERROR, CLAIM_IN_PROGRESS):
+            # 不删除消息，让 SQS 自动重试
             stats["failed"] += 1
-            continue
+        elif claim_result == CLAIM_CONFLICT:
+            # 同一 request_id 的消息体不同，不能当作重复消息丢弃，
+            # 保留消息，多次重试后进入死信队列等待人工处理
+            stats["conflict"] += 1
+            stats["failed"] += 1
+        elif claim_result == CLAIM_DUPLICATE:
+            # 重复消息，直接确认（避免重复处理）
+            stats["duplicate"] += 1
+            duplicates.append(msg)
+        else:
+            claimed.append(msg)
 
-    # 批量转发消息到子队列
-    if messages_to_forward:
-        forward_results = forward_messages_batch(messages_to_forward)
-        stats["success"] = forward_results["success"]
-        stats["failed"] += forward_results["failed"]
+    return claimed, duplicates
 
-        # 将成功转发的消息加入删除列表
-        messages_to_delete.extend(forward_results["to_delete"])
 
-    # 批量删除成功处理的消息
-    if messages_to_delete:
-        delete_results = delete_messages_batch(messages_to_delete, event["Records"])
-        logger.info(f"删除消息结果: {delete_results}")
+def route_messages(messages: List[Dict], stats: Dict[str, int]) -> List[Dict]:
+    """
+    路由阶段：为认领成功的消息选择目标队列（整批只计算一次权重）
 
-    # 返回处理统计
-    logger.info(f"处理完成: {stats}")
-    return {
-        "statusCode": 200,
-        "body": json.dumps(stats)
-    }
+    Args:
+        messages: 认领成功的消息列表
+        stats: 处理统计
+
+    Returns:
+        List[Dict]: 带有 target_region 和 target_queue_url 的消息列表，
+            选择失败时返回空列表（消息不删除，由 SQS 重新投递）
+    """
+    if not messages:
+        return []
+
+    try:
+        targets = get_target_queue_urls(len(messages))
+    except ValueError as e:
+        logger.error("选择目标队列失败: %s", e)
+        stats["failed"] += len(messages)
+        return []
+
+    messages_to_forward = []
+    for msg, (target_region, target_queue_url) in zip(messages, targets):
+        log_record(logger, "消息 %s 将发送到 Region: %s", msg["request_id"], target_region)
+        messages_to_forward.append({
+            **msg,
+            "target_region": target_region,
+            "target_queue_url": target_queue_url,
+        })
+        stats["processed"] += 1
+
+    return messages_to_forward
+
+
+def acknowledge_messages(
+    records: List[Dict],
+    claimed: List[Dict],
+    acknowledged: List[Dict],
+    deadline: Optional[float] = None,
+) -> List[Dict[str, str]]:
+    """
+    确认阶段：结束两阶段幂等性认领，并生成部分批处理响应
+
+    转发成功的消息标记为已完成，其余认领成功的消息释放认领，以便重新投递时
+    立即重试。MANUAL_DELETE_ENABLED 时还会从主队列删除已确认的消息。
+
+    Args:
+        records: SQS 事件中的记录列表
+        claimed: 认领成功的消息列表
+        acknowledged: 已确认处理完成的消息列表（重复消息和转发成功的消息）
+        deadline: DynamoDB 限流重试的截止时间（time.monotonic 时间，None 表示不限制）
+
+    Returns:
+        List[Dict]: batchItemFailures（未确认处理完成的消息）
+    """
+    acknowledged_handles = {msg["receipt_handle"] for msg in acknowledged}
+
+    try:
+        mark_messages_completed([
+            (msg["request_id"], msg["fingerprint"])
+            for msg in claimed if msg["receipt_handle"] in acknowledged_handles
+        ], deadline)
+    except Exception as e:
+        # 消息已转发，认领记录会在租约过期前保持 IN_PROGRESS
+        logger.error("标记消息完成失败: %s", e, exc_info=True)
+
+    try:
+        release_message_claims([
+            msg["request_id"]
+            for msg in claimed if msg["receipt_handle"] not in acknowledged_handles
+        ], deadline)
+    except Exception as e:
+        # 认领记录会在租约过期后自动可被重新认领
+        logger.error("释放消息认领失败: %s", e, exc_info=True)
+
+    # 批量删除已确认的消息（默认由 Lambda 根据 batchItemFailures 自动删除）
+    if MANUAL_DELETE_ENABLED and acknowledged:
+        delete_results = delete_messages_batch(
+            [
+                {"Id": msg["request_id"], "ReceiptHandle": msg["receipt_handle"]}
+                for msg in acknowledged
+            ],
+            records,
+        )
+        logger.debug("删除消息结果: %s", delete_results)
+
+    # 未确认处理完成的消息全部报告为失败，由 SQS 重新投递
+    return [
+        {"itemIdentifier": record.get("messageId")}
+        for record in records
+        if record.get("receiptHandle") not in acknowledged_handles
+    ]
+
+
+def collapse_duplicates(
+    messages: List[Dict],
+) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    在任何 DynamoDB 或 SQS 调用之前合并批次内 request_id 相同的消息。
 
+    主队列重新投递或生产者重复发送时，同一事件中可能多次出现同一 request_id。
+    每个 request_id 只保留首次出现的消息参与认领和转发；消息体指纹相同的副本
+    直接视为重复消息（首条消息失败时会被重新投递，副本无需保留），指纹不同的
+    副本视为冲突。
+
+    Args:
+        messages: 已解析的消息列表（包含 request_id 和 fingerprint）
 
-def forward_messages_batch(messages: List[Dict]) -> Dict[str, Any]:
+    Returns:
+        Tuple: (去重后的消息列表, 重复副本列表, 冲突副本列表)
+    """
+    unique: Dict[str, Dict] = {}
+    duplicates: List[Dict] = []
+    conflicts: List[Dict] = []
+
+    for msg in messages:
+        first = unique.get(msg["request_id"])
+        if first is None:
+            unique[msg["request_id"]] = msg
+        elif first["fingerprint"] == msg["fingerprint"]:
+            duplicates.append(msg)
+        else:
+            conflicts.append(msg)
+
+    if duplicates or conflicts:
+        logger.debug(
+            "批次内去重: 重复副本 %d 条，冲突副本 %d 条", len(duplicates), len(conflicts)
+        )
+    return list(unique.values()), duplicates, conflicts
+
+
+def forward_messages_batch(
+    messages: List[Dict], deadline: Optional[float] = None
+) -> Dict[str, Any]:
     """
     批量转发消息到子队列
 
+    所有目标队列的 SendMessageBatch 调用相互独立，使用线程池并发发送，
+    并发数由 FORWARD_MAX_CONCURRENCY 限制（设为 1 时退化为顺序发送）。
+
+    各 Region 的调用结果会反馈给该 Region 的熔断器。整个调用失败（Region 故障、
+    限流等）时，未发送的消息在本次调用内重新分配到其余 Region（故障转移），
+    直到没有可用的 Region 或超过截止时间。
+
     Args:
-        messages: 待转发的消息列表
+        messages: 待转发的消息列表（包含 target_region 和 target_queue_url）
+        deadline: 重试截止时间（time.monotonic 时间，None 表示不限制）
 
     Returns:
-        Dict: 包含成功、失败数量和待删除消息列表
+        Dict: 包含成功、失败数量和转发成功的消息列表 forwarded
     """
-    results = {"success": 0, "failed": 0, "to_delete": []}
+    results = {"success": 0, "failed": 0, "forwarded": []}
+    failed_regions = set()
+
+    while messages:
+        chunks = _build_chunks(messages)
+        chunk_results = _send_chunks(chunks, deadline)
+
+        unsent = []
+        for (_, batch), chunk_result in zip(chunks, chunk_results):
+            results["success"] += chunk_result["success"]
+            results["failed"] += chunk_result["failed"]
+            results["forwarded"].extend(chunk_result["forwarded"])
+
+            region = batch[0]["target_region"]
+            if chunk_result["success"]:
+                record_region_success(region)
+
+            if chunk_result["unsent"]:
+                failed_regions.add(region)
+                record_region_failure(region)
+                # 未发送的消息不计入该 Region 的路由计数
+                record_routed(region, -len(chunk_result["unsent"]))
+                unsent.extend(chunk_result["unsent"])
+
+        if not unsent:
+            break
+        if not can_wait(deadline, 0):
+            results["failed"] += len(unsent)
+            break
+
+        messages = _reroute(unsent, failed_regions)
+        results["failed"] += len(unsent) - len(messages)
 
-    # 按目标队列分组
+    return results
+
+
+def _build_chunks(messages: List[Dict]) -> List[Tuple[str, List[Dict]]]:
+    """按目标队列分组，并按 SendMessageBatch 的条目数和字节数上限打包"""
     queue_groups = {}
     for msg in messages:
         target_url = msg["target_queue_url"]
@@ -142,54 +540,192 @@ def forward_messages_batch(messages: List[Dict]) -> Dict[str, Any]:
             queue_groups[target_url] = []
         queue_groups[target_url].append(msg)
 
-    # 对每个目标队列批量发送
-    for target_url, msgs in queue_groups.items():
-        # SQS SendMessageBatch 最多支持 10 条消息
-        for i in range(0, len(msgs), 10):
-            batch = msgs[i:i+10]
-            entries = [
-                {
-                    "Id": msg["request_id"],
-                    "MessageBody": msg["message_body"]
-                }
-                for msg in batch
-            ]
-
-            try:
-                response = sqs_client.send_message_batch(
-                    QueueUrl=target_url,
-                    Entries=entries
-                )
+    return [
+        (target_url, batch)
+        for target_url, msgs in queue_groups.items()
+        for batch in pack_batches(msgs)
+    ]
+
+
+def _body_size(message_body: str) -> int:
+    """消息体的 UTF-8 字节数（纯 ASCII 时无需编码）"""
+    if message_body.isascii():
+        return len(message_body)
+    return len(message_body.encode("utf-8"))
+
+
+def pack_batches(
+    messages: List[Dict],
+    max_entries: int = SQS_MAX_BATCH_ENTRIES,
+    max_bytes: int = SQS_MAX_BATCH_BYTES,
+) -> List[List[Dict]]:
+    """
+    将发往同一队列的消息打包为 SendMessageBatch 批次。
+
+    使用 first-fit：每条消息放入第一个条目数和字节数都未超限的批次，
+    否则新开一个批次。单条超过 max_bytes 的消息单独成批，
+    避免拖累同批的其他消息被整体拒绝。
+
+    Args:
+        messages: 待发送的消息列表
+        max_entries: 每批最大条目数
+        max_bytes: 每批消息体总字节数上限
+
+    Returns:
+        List[List[Dict]]: 批次列表
+    """
+    batches: List[List[Dict]] = []
+    batch_bytes: List[int] = []
+
+    for msg in messages:
+        size = _body_size(msg["message_body"])
+        if size > max_bytes:
+            logger.warning(
+                "消息 %s 大小 %d 字节超过批量上限 %d，单独发送",
+                msg["request_id"], size, max_bytes
+            )
+            batches.append([msg])
+            batch_bytes.append(max_bytes)
+            continue
+
+        for index, batch in enumerate(batches):
+            if len(batch) < max_entries and batch_bytes[index] + size <= max_bytes:
+                batch.append(msg)
+                batch_bytes[index] += size
+                break
+        else:
+            batches.append([msg])
+            batch_bytes.append(size)
+
+    return batches
+
+
+def _send_chunks(
+    chunks: List[Tuple[str, List[Dict]]], deadline: Optional[float]
+) -> List[Dict[str, Any]]:
+    """发送所有分组（并发数由 FORWARD_MAX_CONCURRENCY 限制），返回与 chunks 顺序一致的结果"""
+    if _forward_executor is None or len(chunks) <= 1:
+        return [send_batch(target_url, batch, deadline) for target_url, batch in chunks]
+
+    return list(_forward_executor.map(lambda chunk: send_batch(*chunk, deadline), chunks))
 
-                # 处理成功的消息
-                for success_msg in response.get("Successful", []):
-                    msg_id = success_msg["Id"]
-                    results["success"] += 1
-
-                    # 找到对应的消息，加入删除列表
-                    for msg in batch:
-                        if msg["request_id"] == msg_id:
-                            results["to_delete"].append({
-                                "Id": msg_id,
-                                "ReceiptHandle": msg["receipt_handle"]
-                            })
-                            break
-
-                # 处理失败的消息
-                for failed_msg in response.get("Failed", []):
-                    msg_id = failed_msg["Id"]
-                    logger.error(
-                        f"消息 {msg_id} 发送失败: "
-                        f"{failed_msg.get('Code')} - {failed_msg.get('Message')}"
-                    )
-                    results["failed"] += 1
 
-            except Exception as e:
+def _reroute(messages: List[Dict], failed_regions: set) -> List[Dict]:
+    """
+    将转发失败的消息重新分配到其余 Region。
+
+    Args:
+        messages: 未发送的消息
+        failed_regions: 本次调用中转发失败的 Region
+
+    Returns:
+        List[Dict]: 已分配新目标的消息，没有可用 Region 时返回空列表
+    """
+    try:
+        targets = get_target_queue_urls(len(messages), exclude=failed_regions)
+    except ValueError as e:
+        logger.error("%d 条消息无法故障转移: %s", len(messages), e)
+        return []
+
+    rerouted = []
+    for msg, (target_region, target_queue_url) in zip(messages, targets):
+        log_record(
+            logger, "消息 %s 从 %s 故障转移到 %s",
+            msg["request_id"], msg["target_region"], target_region
+        )
+        rerouted.append({
+            **msg,
+            "target_region": target_region,
+            "target_queue_url": target_queue_url,
+        })
+    return rerouted
+
+
+def send_batch(
+    target_url: str, batch: List[Dict], deadline: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    发送一批消息（最多 10 条，由 pack_batches 打包）到单个目标队列
+
+    部分条目失败时只重试失败的条目（带抖动的指数退避），最多重试
+    FORWARD_MAX_RETRIES 次，且等待后不超过截止时间。SenderFault 为 true 的
+    条目（消息本身有问题）不重试。
+
+    Args:
+        target_url: 目标队列 URL
+        batch: 待发送的消息列表
+        deadline: 重试截止时间（time.monotonic 时间，None 表示不限制）
+
+    Returns:
+        Dict: 包含成功、失败数量、发送成功的消息列表 forwarded，以及整个调用
+            失败时未发送的消息 unsent（可以转发到其他 Region）
+    """
+    results = {"success": 0, "failed": 0, "forwarded": [], "unsent": []}
+
+    # 尚未发送成功的消息（条目 Id -> 消息）
+    # 条目 Id 使用批次内下标：request_id 可能重复或含有 Id 不允许的字符
+    pending = {str(index): msg for index, msg in enumerate(batch)}
+    attempt = 0
+
+    try:
+        while pending:
+            response = sqs_client.send_message_batch(
+                QueueUrl=target_url,
+                Entries=[
+                    {"Id": msg_id, "MessageBody": msg["message_body"]}
+                    for msg_id, msg in pending.items()
+                ]
+            )
+
+            # 处理成功的消息，加入已转发列表
+            for success_msg in response.get("Successful", []):
+                msg = pending.pop(success_msg["Id"], None)
+                if msg is None:
+                    continue
+                results["success"] += 1
+                results["forwarded"].append(msg)
+
+            # 处理失败的消息：SenderFault 的不重试，其余（限流、服务端错误）重试
+            retryable = {}
+            for failed_msg in response.get("Failed", []):
+                msg_id = failed_msg["Id"]
+                msg = pending.pop(msg_id, None)
+                if msg is None:
+                    continue
                 logger.error(
-                    f"批量发送消息到 {target_url} 失败: {str(e)}",
-                    exc_info=True
+                    "消息 %s 发送失败: %s - %s",
+                    msg["request_id"], failed_msg.get("Code"), failed_msg.get("Message")
                 )
-                results["failed"] += len(batch)
+                if failed_msg.get("SenderFault"):
+                    results["failed"] += 1
+                else:
+                    retryable[msg_id] = msg
+
+            # 剩余的是可重试的失败条目（以及响应中未出现的条目）
+            pending.update(retryable)
+            if not pending:
+                break
+
+            delay = full_jitter_delay(
+                attempt, FORWARD_RETRY_BASE_DELAY, FORWARD_RETRY_MAX_DELAY
+            )
+            if attempt >= FORWARD_MAX_RETRIES or not can_wait(deadline, delay):
+                break
+
+            logger.warning(
+                "%d 条消息发送到 %s 失败，%.3f 秒后重试", len(pending), target_url, delay
+            )
+            time.sleep(delay)
+            attempt += 1
+
+        results["failed"] += len(pending)
+
+    except Exception as e:
+        logger.error(
+            "批量发送消息到 %s 失败: %s", target_url, e,
+            exc_info=True
+        )
+        results["unsent"].extend(pending.values())
 
     return results
 
@@ -232,24 +768,32 @@ def delete_messages_batch(
     for i in range(0, len(messages_to_delete), 10):
         batch = messages_to_delete[i:i+10]
 
+        # 条目 Id 使用批次内下标，避免重复的 request_id 导致整批被拒绝
+        entries_by_id = {str(index): msg for index, msg in enumerate(batch)}
+
         try:
             response = sqs_client.delete_message_batch(
                 QueueUrl=queue_url,
-                Entries=batch
+                Entries=[
+                    {"Id": entry_id, "ReceiptHandle": msg["ReceiptHandle"]}
+                    for entry_id, msg in entries_by_id.items()
+                ]
             )
 
             results["success"] += len(response.get("Successful", []))
 
             for failed_msg in response.get("Failed", []):
+                msg = entries_by_id.get(failed_msg["Id"], {})
                 logger.error(
-                    f"删除消息 {failed_msg['Id']} 失败: "
-                    f"{failed_msg.get('Code')} - {failed_msg.get('Message')}"
+                    "删除消息 %s 失败: %s - %s",
+                    msg.get("Id", failed_msg["Id"]),
+                    failed_msg.get("Code"), failed_msg.get("Message")
                 )
                 results["failed"] += 1
 
         except Exception as e:
             logger.error(
-                f"批量删除消息失败: {str(e)}",
+                "批量删除消息失败: %s", e,
                 exc_info=True
             )
             results["failed"] += len(batch)
@@ -2,23 +2,178 @@
 幂等性检查模块
 
 使用 DynamoDB 实现基于 request_id 的消息去重机制。
+
+记录采用两阶段状态：
+- IN_PROGRESS: 已认领，持有短期租约（lease_until），转发尚未完成
+- COMPLETED: 已成功转发（没有 status 属性的旧记录同样视为已完成）
+
+转发成功后调用 mark_messages_completed；转发失败时调用 release_message_claims
+删除认领记录，使重新投递的消息可以立即重新认领。Lambda 异常退出时，
+租约过期后的记录同样可以被重新认领。
+
+记录中保存消息体指纹（IDEMPOTENCY_BODY_HASH），request_id 相同但指纹
+不同的消息判定为冲突（CLAIM_CONFLICT），不会被当作重复消息静默丢弃。
+
+记录格式（legacy / compact）见 idempotency_records 模块。
+DynamoDB 限流时按带抖动的指数退避重试，而不是让记录直接失败。
 """
 import time
+import uuid
+import zlib
 import hashlib
 import logging
-from datetime import datetime
-from typing import Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Dict, List, Optional, Tuple, Union
 import boto3
-from botocore.exceptions import ClientError
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
 
 import os
 
+from backoff import can_wait, full_jitter_delay
+from log_sampling import log_record
+from idempotency_records import (
+    build_record,
+    normalize_record,
+    stored_fingerprint,
+    RECORD_FORMAT_LEGACY,
+    STATUS_COMPLETED,
+    STATUS_IN_PROGRESS,
+)
+
 logger = logging.getLogger(__name__)
 
+# DynamoDB 调用的连接和读取超时（秒）及 SDK 的最大尝试次数（含首次调用），
+# 避免单次调用卡住时耗尽认领或确认阶段的剩余时间
+DYNAMODB_CALL_TIMEOUT = float(os.environ.get("DYNAMODB_CALL_TIMEOUT", "2"))
+DYNAMODB_MAX_ATTEMPTS = int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", "3"))
+
 # 全局 DynamoDB 资源（Lambda 容器复用时保持）
-dynamodb = boto3.resource("dynamodb")
+# adaptive 重试模式在客户端收到限流错误后自动降低请求速率。
+# 资源对象不是线程安全的，写入统一通过线程安全的 dynamodb.meta.client 发起
+dynamodb = boto3.resource(
+    "dynamodb",
+    config=Config(
+        connect_timeout=DYNAMODB_CALL_TIMEOUT,
+        read_timeout=DYNAMODB_CALL_TIMEOUT,
+        retries={"mode": "adaptive", "total_max_attempts": DYNAMODB_MAX_ATTEMPTS},
+    ),
+)
 idempotency_table = None
 
+# BatchWriteItem 单次最多支持 25 个请求
+BATCH_WRITE_MAX_ITEMS = 25
+
+# 限流错误：SDK 重试用尽后，再按带抖动的指数退避重试
+THROTTLING_ERROR_CODES = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+IDEMPOTENCY_THROTTLE_RETRIES = int(os.environ.get("IDEMPOTENCY_THROTTLE_RETRIES", "3"))
+# 退避基数和上限（秒）
+THROTTLE_BACKOFF_BASE = 0.05
+THROTTLE_BACKOFF_MAX = 1.0
+
+# 批量幂等性检查的结果
+CLAIM_FIRST_TIME = "first_time"    # 首次处理（或租约已过期），已认领
+CLAIM_DUPLICATE = "duplicate"      # 已完成的重复消息，应跳过
+CLAIM_IN_PROGRESS = "in_progress"  # 其他调用正在处理（租约未过期），应保留消息等待重试
+CLAIM_ERROR = "error"              # 写入失败，应保留消息等待重试
+CLAIM_CONFLICT = "conflict"        # request_id 已存在但消息体不同，应保留消息交由死信队列处理
+
+# 认领租约时长（秒）：需大于 Lambda 超时时间，小于主队列可见性超时，
+# 这样异常退出后重新投递的消息一定能重新认领
+IDEMPOTENCY_LEASE_SECONDS = int(os.environ.get("IDEMPOTENCY_LEASE_SECONDS", "360"))
+
+# 认领条件：记录不存在，或其他调用的租约已过期
+CLAIM_CONDITION = (
+    "attribute_not_exists(request_id) "
+    "OR (#status = :in_progress AND lease_until < :now)"
+)
+
+# 本次调用的认领令牌，写入 IN_PROGRESS 记录。SDK 重试一个实际已成功的认领写入时，
+# 条件检查失败返回的是本次调用自己的记录，令牌相同即视为认领成功
+claim_token = uuid.uuid4().hex
+
+# 消息体指纹算法：none（不计算）、crc32（快速非加密哈希）、sha256（默认）
+# 指纹只用于发现 request_id 相同但消息体不同的冲突
+IDEMPOTENCY_BODY_HASH = os.environ.get("IDEMPOTENCY_BODY_HASH", "sha256")
+
+# 新写入记录的格式：legacy（默认）或 compact，两种格式可以同时存在于表中
+IDEMPOTENCY_RECORD_FORMAT = os.environ.get(
+    "IDEMPOTENCY_RECORD_FORMAT", RECORD_FORMAT_LEGACY
+)
+
+# 本容器近期已完成 request_id 的 LRU 缓存（0 表示关闭）
+# 每个条目约占 100~200 字节，默认上限约 2 MB
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(
+    os.environ.get("IDEMPOTENCY_CACHE_MAX_ENTRIES", "10000")
+)
+# 缓存条目的有效期（秒），需小于 DynamoDB 记录的 TTL
+IDEMPOTENCY_CACHE_TTL = int(os.environ.get("IDEMPOTENCY_CACHE_TTL", "300"))
+
+# request_id -> (过期时间（time.monotonic）, 消息体指纹)，按最近使用顺序排列
+_recent_claims: "OrderedDict[str, Tuple[float, Optional[str]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+
+# 条件检查失败时返回的已有记录为 DynamoDB 低级 API 格式，需转换为 Python 值
+_deserializer = TypeDeserializer()
+
+
+def _backoff_delay(attempt: int) -> float:
+    """计算第 attempt 次重试前的等待时间（full jitter 指数退避）"""
+    return full_jitter_delay(attempt, THROTTLE_BACKOFF_BASE, THROTTLE_BACKOFF_MAX)
+
+
+def _call_with_throttle_retry(
+    operation, *args, deadline: Optional[float] = None, **kwargs
+):
+    """
+    调用 DynamoDB 操作，遇到限流错误时退避重试。
+
+    Args:
+        operation: 要调用的函数
+        *args, **kwargs: 调用参数
+        deadline: 截止时间（time.monotonic 时间，None 表示不限制），
+            退避等待会超过截止时间时不再重试
+
+    Returns:
+        operation 的返回值
+
+    Raises:
+        ClientError: 非限流错误，或重试 IDEMPOTENCY_THROTTLE_RETRIES 次
+            （或到达截止时间）后仍被限流
+    """
+    for attempt in range(IDEMPOTENCY_THROTTLE_RETRIES + 1):
+        try:
+            return operation(*args, **kwargs)
+        except ClientError as e:
+            code = e.response["Error"]["Code"]
+            if code not in THROTTLING_ERROR_CODES or attempt == IDEMPOTENCY_THROTTLE_RETRIES:
+                raise
+            delay = _backoff_delay(attempt)
+            if not can_wait(deadline, delay):
+                raise
+            logger.warning("DynamoDB 限流（%s），%.3f 秒后重试", code, delay)
+            time.sleep(delay)
+
+
+def new_claim_token() -> str:
+    """
+    为新的一次调用生成认领令牌（每次调用开始时调用）。
+
+    Returns:
+        str: 新的认领令牌
+    """
+    global claim_token
+    claim_token = uuid.uuid4().hex
+    return claim_token
+
 
 def get_idempotency_table():
     """获取 DynamoDB 幂等性表（懒加载）"""
@@ -29,74 +184,499 @@ def get_idempotency_table():
     return idempotency_table
 
 
-def check_and_record_message(request_id: str, message_body: str) -> bool:
+def body_fingerprint(message_body: Union[str, bytes]) -> Optional[str]:
     """
-    检查消息是否已被处理，并记录到 DynamoDB。
+    按 IDEMPOTENCY_BODY_HASH 计算消息体指纹。
+
+    bytes 类型的消息体直接参与计算，不再复制；str 类型只编码一次。
+    sha256 指纹为十六进制摘要（与旧记录格式相同），其他算法带有
+    “算法名:” 前缀，以便与旧记录区分。
 
     Args:
-        request_id: 请求唯一 ID
         message_body: 消息体内容
 
     Returns:
-        bool: True 表示首次处理（可以继续），False 表示重复消息（应跳过）
+        str: 消息体指纹，IDEMPOTENCY_BODY_HASH 为 none 时返回 None
     """
-    table = get_idempotency_table()
+    if IDEMPOTENCY_BODY_HASH == "none":
+        return None
+
+    data = message_body
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    if IDEMPOTENCY_BODY_HASH == "crc32":
+        return f"crc32:{zlib.crc32(data):08x}"
+    return hashlib.sha256(data).hexdigest()
+
+
+def _fingerprint_algorithm(fingerprint: str) -> str:
+    """返回指纹对应的算法名（无前缀的为 sha256）"""
+    algorithm, separator, _ = fingerprint.partition(":")
+    return algorithm if separator else "sha256"
+
+
+def _fingerprints_conflict(stored: Optional[str], current: Optional[str]) -> bool:
+    """
+    判断两个指纹是否表示不同的消息体。
+
+    任一指纹缺失或算法不同（如切换 IDEMPOTENCY_BODY_HASH 前写入的记录）时
+    无法比较，视为不冲突。
+    """
+    if not stored or not current:
+        return False
+    if _fingerprint_algorithm(stored) != _fingerprint_algorithm(current):
+        return False
+    return stored != current
 
-    # 计算消息体的 SHA256 哈希值
-    message_hash = hashlib.sha256(message_body.encode("utf-8")).hexdigest()
 
+def _build_record(
+    request_id: str, fingerprint: Optional[str], status: str = STATUS_IN_PROGRESS
+) -> dict:
+    """
+    构建幂等性记录。
+
+    Args:
+        request_id: 请求唯一 ID
+        fingerprint: 消息体指纹（body_fingerprint 的结果，可为 None）
+        status: 记录状态，IN_PROGRESS 记录带有租约
+
+    Returns:
+        dict: 待写入 DynamoDB 的记录（格式由 IDEMPOTENCY_RECORD_FORMAT 决定）
+    """
     # 计算 TTL（7 天后过期）
     ttl_days = int(os.environ.get("IDEMPOTENCY_TTL_DAYS", "7"))
-    ttl_seconds = ttl_days * 24 * 3600
-    ttl_timestamp = int(time.time()) + ttl_seconds
 
+    return build_record(
+        request_id,
+        fingerprint,
+        status,
+        now=time.time(),
+        ttl_seconds=ttl_days * 24 * 3600,
+        lease_seconds=IDEMPOTENCY_LEASE_SECONDS,
+        record_format=IDEMPOTENCY_RECORD_FORMAT,
+        claim_token=claim_token,
+    )
+
+
+def _claim_outcome(
+    request_id: str, existing: Optional[dict], fingerprint: Optional[str]
+) -> str:
+    """
+    根据条件检查失败时返回的已有记录判断认领结果。
+
+    Args:
+        request_id: 请求唯一 ID
+        existing: 已有记录（DynamoDB 低级 API 格式，可能为空）
+        fingerprint: 本次消息体的指纹
+
+    Returns:
+        str: CLAIM_FIRST_TIME / CLAIM_DUPLICATE / CLAIM_IN_PROGRESS / CLAIM_CONFLICT
+    """
+    item = {
+        key: _deserializer.deserialize(value) for key, value in (existing or {}).items()
+    }
+
+    # 本次调用自己的认领记录：之前的写入已成功，重试时才因条件检查失败
+    if item.get("status") == STATUS_IN_PROGRESS and item.get("claim_token") == claim_token:
+        log_record(logger, "消息 %s 已由本次调用认领（重试的写入此前已成功）", request_id)
+        return CLAIM_FIRST_TIME
+    existing_fingerprint = stored_fingerprint(item)
+
+    if _fingerprints_conflict(existing_fingerprint, fingerprint):
+        logger.error("消息 %s 与已有记录的消息体不同，判定为冲突", request_id)
+        return CLAIM_CONFLICT
+
+    if item.get("status") == STATUS_IN_PROGRESS:
+        logger.warning("消息 %s 正在被其他调用处理，稍后重试", request_id)
+        return CLAIM_IN_PROGRESS
+
+    # 没有 status 的旧记录视为已完成
+    log_record(logger, "消息 %s 已被处理过，跳过", request_id)
+    _cache_add(request_id, existing_fingerprint)
+    return CLAIM_DUPLICATE
+
+
+def _cache_lookup(request_id: str, fingerprint: Optional[str]) -> Optional[str]:
+    """
+    在本容器最近完成的缓存中查找 request_id（并更新命中统计）。
+
+    Args:
+        request_id: 请求唯一 ID
+        fingerprint: 本次消息体的指纹
+
+    Returns:
+        str: 命中时返回 CLAIM_DUPLICATE（消息体指纹不同时返回 CLAIM_CONFLICT），
+            未命中返回 None
+    """
+    if IDEMPOTENCY_CACHE_MAX_ENTRIES <= 0:
+        return None
+
+    now = time.monotonic()
+    with _cache_lock:
+        entry = _recent_claims.get(request_id)
+        if entry is not None and entry[0] > now:
+            _recent_claims.move_to_end(request_id)
+            cache_stats["hits"] += 1
+            if _fingerprints_conflict(entry[1], fingerprint):
+                return CLAIM_CONFLICT
+            return CLAIM_DUPLICATE
+
+        if entry is not None:
+            del _recent_claims[request_id]
+        cache_stats["misses"] += 1
+        return None
+
+
+def _cache_add(request_id: str, fingerprint: Optional[str]) -> None:
+    """
+    将已确认完成的 request_id 加入缓存，超出容量时淘汰最久未使用的条目。
+
+    处理中（IN_PROGRESS）的记录不加入缓存，以便租约过期后可以重新认领。
+
+    Args:
+        request_id: 请求唯一 ID
+        fingerprint: 已完成记录的消息体指纹
+    """
+    if IDEMPOTENCY_CACHE_MAX_ENTRIES <= 0:
+        return
+
+    with _cache_lock:
+        _recent_claims[request_id] = (
+            time.monotonic() + IDEMPOTENCY_CACHE_TTL, fingerprint
+        )
+        _recent_claims.move_to_end(request_id)
+        while len(_recent_claims) > IDEMPOTENCY_CACHE_MAX_ENTRIES:
+            _recent_claims.popitem(last=False)
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """
+    获取本容器幂等性缓存的统计信息。
+
+    Returns:
+        Dict[str, int]: 命中数、未命中数和当前条目数
+    """
+    with _cache_lock:
+        return {**cache_stats, "size": len(_recent_claims)}
+
+
+def check_and_record_message(request_id: str, message_body: str) -> bool:
+    """
+    检查消息是否已被处理，并认领到 DynamoDB。
+
+    先查询本容器的近期记录缓存，命中时直接判定为重复消息，不访问 DynamoDB。
+    需要区分“已完成”和“正在被其他调用处理”时使用 claim_message。
+
+    Args:
+        request_id: 请求唯一 ID
+        message_body: 消息体内容
+
+    Returns:
+        bool: True 表示已认领（可以继续），False 表示重复、冲突或正在处理（应跳过）
+    """
+    return claim_message(request_id, message_body) == CLAIM_FIRST_TIME
+
+
+def claim_message(request_id: str, message_body: str) -> str:
+    """
+    认领单条消息。
+
+    Args:
+        request_id: 请求唯一 ID
+        message_body: 消息体内容
+
+    Returns:
+        str: CLAIM_FIRST_TIME / CLAIM_DUPLICATE / CLAIM_IN_PROGRESS / CLAIM_CONFLICT
+
+    Raises:
+        ClientError: 条件检查失败以外的 DynamoDB 错误
+    """
+    fingerprint = body_fingerprint(message_body)
+    cached = _cache_lookup(request_id, fingerprint)
+    if cached is not None:
+        _log_cache_hit(request_id, cached)
+        return cached
+
+    return _put_record(request_id, fingerprint)
+
+
+def _log_cache_hit(request_id: str, result: str) -> None:
+    """记录本地缓存命中的日志"""
+    if result == CLAIM_CONFLICT:
+        logger.error("消息 %s 与已完成记录的消息体不同（本地缓存命中），判定为冲突", request_id)
+    else:
+        log_record(logger, "消息 %s 已被处理过（本地缓存命中），跳过", request_id)
+
+
+def _put_record(
+    request_id: str, fingerprint: Optional[str], deadline: Optional[float] = None
+) -> str:
+    """
+    使用条件写入认领幂等性记录。
+
+    Args:
+        request_id: 请求唯一 ID
+        fingerprint: 消息体指纹
+        deadline: 限流重试的截止时间（time.monotonic 时间，None 表示不限制）
+
+    Returns:
+        str: CLAIM_FIRST_TIME / CLAIM_DUPLICATE / CLAIM_IN_PROGRESS / CLAIM_CONFLICT
+
+    Raises:
+        ClientError: 条件检查失败以外的 DynamoDB 错误
+    """
     try:
         # 尝试写入 DynamoDB（使用条件表达式确保幂等性）
-        table.put_item(
-            Item={
-                "request_id": request_id,
-                "message_body_hash": message_hash,
-                "processed_at": datetime.utcnow().isoformat(),
-                "ttl": ttl_timestamp,
+        _call_with_throttle_retry(
+            dynamodb.meta.client.put_item,
+            TableName=get_idempotency_table().name,
+            Item=_build_record(request_id, fingerprint),
+            ConditionExpression=CLAIM_CONDITION,
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={
+                ":in_progress": STATUS_IN_PROGRESS,
+                ":now": int(time.time()),
             },
-            ConditionExpression="attribute_not_exists(request_id)",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD",
+            deadline=deadline,
         )
 
-        logger.info(f"消息 {request_id} 首次处理，已记录到 DynamoDB")
-        return True  # 首次处理
+        log_record(logger, "消息 %s 首次处理，已记录到 DynamoDB", request_id)
+        return CLAIM_FIRST_TIME
 
     except ClientError as e:
         if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
-            # request_id 已存在，说明消息已被处理过
-            logger.warning(f"消息 {request_id} 已被处理过，跳过")
-            return False  # 重复消息
+            # request_id 已存在：已完成或正在被其他调用处理
+            return _claim_outcome(request_id, e.response.get("Item"), fingerprint)
         else:
             # 其他 DynamoDB 错误
             logger.error(
-                f"DynamoDB 写入失败: {e.response['Error']['Message']}",
+                "DynamoDB 写入失败: %s", e.response["Error"]["Message"],
                 exc_info=True
             )
             raise
 
 
+def check_and_record_messages(
+    messages: List[Tuple[str, str]],
+    deadline: Optional[float] = None,
+    executor: Optional[Executor] = None,
+) -> List[str]:
+    """
+    批量检查消息是否已被处理，并认领到 DynamoDB。
+
+    每条记录一次条件 PutItem（1 WCU），通过 executor 并发发起，整批只需
+    一次往返的时间；每条记录的结果由各自的写入决定，单条失败不影响其他记录。
+
+    同一批次内重复出现的 request_id 只写入一次，后续副本的结果跟随首次出现的记录
+    （首条认领成功时副本视为重复）。
+
+    Args:
+        messages: (request_id, fingerprint) 列表，fingerprint 为
+            body_fingerprint(message_body) 的结果，调用方计算一次后可在
+            mark_messages_completed 中复用
+        deadline: 截止时间（time.monotonic 时间，None 表示不限制），之后不再重试，
+            尚未写入的记录结果为 CLAIM_ERROR
+        executor: 并发写入使用的线程池（None 时逐条写入）
+
+    Returns:
+        List[str]: 与输入顺序一致的结果列表，取值为
+            CLAIM_FIRST_TIME / CLAIM_DUPLICATE / CLAIM_IN_PROGRESS /
+            CLAIM_CONFLICT / CLAIM_ERROR
+    """
+    results = [CLAIM_ERROR] * len(messages)
+
+    # 批次内去重：同一 request_id 只写入一次
+    first_index: Dict[str, int] = {}
+    copies: List[Tuple[int, int]] = []
+    pending: List[int] = []
+    for index, (request_id, fingerprint) in enumerate(messages):
+        if request_id in first_index:
+            copies.append((index, first_index[request_id]))
+        else:
+            first_index[request_id] = index
+            # 本地缓存命中的一定是已完成的消息，无需访问 DynamoDB
+            cached = _cache_lookup(request_id, fingerprint)
+            if cached is not None:
+                _log_cache_hit(request_id, cached)
+                results[index] = cached
+            else:
+                pending.append(index)
+
+    def claim(index: int) -> str:
+        # 已到截止时间的记录保持 CLAIM_ERROR，由 SQS 重新投递
+        if not can_wait(deadline, 0):
+            return CLAIM_ERROR
+        try:
+            return _put_record(*messages[index], deadline=deadline)
+        except ClientError:
+            return CLAIM_ERROR
+        except BotoCoreError as e:
+            # 超时、连接失败等传输错误只影响本条记录
+            logger.error("DynamoDB 写入失败: %s", e)
+            return CLAIM_ERROR
+
+    if executor is None or len(pending) <= 1:
+        claim_results = [claim(index) for index in pending]
+    else:
+        claim_results = list(executor.map(claim, pending))
+    for index, claim_result in zip(pending, claim_results):
+        results[index] = claim_result
+
+    for index, origin in copies:
+        # 首条记录认领成功或已完成时副本视为重复；否则副本同样需要重试
+        results[index] = (
+            CLAIM_DUPLICATE
+            if results[origin] in (CLAIM_FIRST_TIME, CLAIM_DUPLICATE)
+            else results[origin]
+        )
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(
+            "批量幂等性检查完成: 共 %d 条，首次 %d 条，重复 %d 条，"
+            "处理中 %d 条，冲突 %d 条，失败 %d 条",
+            len(messages),
+            results.count(CLAIM_FIRST_TIME),
+            results.count(CLAIM_DUPLICATE),
+            results.count(CLAIM_IN_PROGRESS),
+            results.count(CLAIM_CONFLICT),
+            results.count(CLAIM_ERROR),
+        )
+    return results
+
+
+def _batch_write(requests: List[dict], deadline: Optional[float] = None) -> int:
+    """
+    使用 BatchWriteItem 写入一组请求（每 25 条一次调用）。
+
+    DynamoDB 限流时可能只处理部分条目，未处理的条目（UnprocessedItems）按带抖动
+    的指数退避重发，最多重发 IDEMPOTENCY_THROTTLE_RETRIES 次，退避等待会超过
+    截止时间时不再重发。
+
+    Args:
+        requests: PutRequest / DeleteRequest 列表（request_id 互不相同）
+        deadline: 截止时间（time.monotonic 时间，None 表示不限制）
+
+    Returns:
+        int: 放弃重发后仍未处理的条目数
+
+    Raises:
+        ClientError: 非限流错误，或整批请求在重试后仍被限流
+    """
+    table_name = get_idempotency_table().name
+    unprocessed = 0
+
+    for i in range(0, len(requests), BATCH_WRITE_MAX_ITEMS):
+        pending = requests[i:i + BATCH_WRITE_MAX_ITEMS]
+        if not can_wait(deadline, 0):
+            unprocessed += len(requests) - i
+            break
+
+        for attempt in range(IDEMPOTENCY_THROTTLE_RETRIES + 1):
+            response = _call_with_throttle_retry(
+                dynamodb.meta.client.batch_write_item,
+                RequestItems={table_name: pending},
+                deadline=deadline,
+            )
+            pending = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not pending or attempt == IDEMPOTENCY_THROTTLE_RETRIES:
+                break
+            delay = _backoff_delay(attempt)
+            if not can_wait(deadline, delay):
+                break
+            logger.warning("DynamoDB 未处理 %d 条批量写入，%.3f 秒后重发", len(pending), delay)
+            time.sleep(delay)
+
+        unprocessed += len(pending)
+
+    return unprocessed
+
+
+def mark_messages_completed(
+    messages: List[Tuple[str, str]], deadline: Optional[float] = None
+) -> None:
+    """
+    将已成功转发的消息标记为已完成。
+
+    使用 BatchWriteItem 覆盖写入完成记录（每 25 条一次调用）。放弃重发的记录
+    保持 IN_PROGRESS，由 TTL 清理（消息已转发并从队列删除，不会再被认领）。
+
+    Args:
+        messages: (request_id, fingerprint) 列表
+        deadline: 重试的截止时间（time.monotonic 时间，None 表示不限制）
+    """
+    if not messages:
+        return
+
+    # BatchWriteItem 不允许同一请求中出现重复的主键，后出现的记录覆盖先出现的
+    records = {}
+    for request_id, fingerprint in messages:
+        records[request_id] = {
+            "PutRequest": {"Item": _build_record(request_id, fingerprint, STATUS_COMPLETED)}
+        }
+    unprocessed = _batch_write(list(records.values()), deadline)
+    if unprocessed:
+        logger.warning("%d 条完成记录未能写入，保持 IN_PROGRESS 直到 TTL 过期", unprocessed)
+
+    for request_id, fingerprint in messages:
+        _cache_add(request_id, fingerprint)
+
+    logger.debug("已将 %d 条消息标记为已完成", len(messages) - unprocessed)
+
+
+def release_message_claims(
+    request_ids: List[str], deadline: Optional[float] = None
+) -> None:
+    """
+    释放未能转发的消息的认领记录，使重新投递时可以立即重新认领。
+
+    放弃重发的认领记录在租约过期后同样可以被重新认领。
+
+    Args:
+        request_ids: 请求唯一 ID 列表
+        deadline: 重试的截止时间（time.monotonic 时间，None 表示不限制）
+    """
+    if not request_ids:
+        return
+
+    unprocessed = _batch_write(
+        [
+            {"DeleteRequest": {"Key": {"request_id": request_id}}}
+            for request_id in dict.fromkeys(request_ids)
+        ],
+        deadline,
+    )
+    if unprocessed:
+        logger.warning("%d 条认领记录未能释放，将在租约过期后可重新认领", unprocessed)
+
+    logger.debug("已释放 %d 条消息的认领记录", len(request_ids) - unprocessed)
+
+
 def get_processed_record(request_id: str) -> Optional[dict]:
     """
     查询 DynamoDB 中是否存在已处理的记录。
 
+    legacy 和 compact 两种格式的记录都转换为 legacy 格式的字段返回，
+    没有 status 的记录补充为 COMPLETED。
+
     Args:
         request_id: 请求唯一 ID
 
     Returns:
-        dict: 已处理的记录，如果不存在则返回 None
+        dict: 记录（request_id、status、processed_at、ttl，以及可能存在的
+            message_body_hash、lease_until），如果不存在则返回 None
     """
     table = get_idempotency_table()
 
     try:
-        response = table.get_item(Key={"request_id": request_id})
-        return response.get("Item")
+        response = _call_with_throttle_retry(
+            table.get_item, Key={"request_id": request_id}
+        )
+        item = response.get("Item")
+        return normalize_record(item) if item else None
     except ClientError as e:
         logger.error(
-            f"DynamoDB 查询失败: {e.response['Error']['Message']}",
+            "DynamoDB 查询失败: %s", e.response["Error"]["Message"],
             exc_info=True
         )
         raise
@@ -0,0 +1,168 @@
+"""
+幂等性记录格式模块
+
+定义幂等性记录的两种存储格式，由 IDEMPOTENCY_RECORD_FORMAT 环境变量选择：
+- legacy: request_id、十六进制 message_body_hash、ISO 格式 processed_at、ttl（默认）
+- compact: request_id、二进制摘要 d（首字节为算法编号）、整数时间戳 t、ttl；
+  已完成的记录不写 status（没有 status 的记录视为已完成）
+
+两种格式共用 status、lease_until 和 claim_token 属性名，认领条件对两种格式同样有效，
+因此切换格式不需要迁移已有记录，读取时由 normalize_record 统一转换。
+
+本模块不依赖 AWS SDK，可在本地基准测试中直接使用。
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+# 记录格式
+RECORD_FORMAT_LEGACY = "legacy"
+RECORD_FORMAT_COMPACT = "compact"
+RECORD_FORMATS = (RECORD_FORMAT_LEGACY, RECORD_FORMAT_COMPACT)
+
+# 记录状态
+STATUS_IN_PROGRESS = "IN_PROGRESS"
+STATUS_COMPLETED = "COMPLETED"
+
+# compact 格式二进制摘要首字节的算法编号
+_DIGEST_ALGORITHMS = {"sha256": 1, "crc32": 2}
+_DIGEST_ALGORITHM_NAMES = {code: name for name, code in _DIGEST_ALGORITHMS.items()}
+
+
+def encode_fingerprint(fingerprint: str) -> bytes:
+    """
+    将指纹字符串编码为 compact 格式的二进制摘要。
+
+    Args:
+        fingerprint: 指纹（sha256 为十六进制摘要，其他算法为 “算法名:十六进制摘要”）
+
+    Returns:
+        bytes: 1 字节算法编号 + 原始摘要
+    """
+    algorithm, separator, digest = fingerprint.partition(":")
+    if not separator:
+        algorithm, digest = "sha256", fingerprint
+    return bytes([_DIGEST_ALGORITHMS[algorithm]]) + bytes.fromhex(digest)
+
+
+def decode_fingerprint(data: bytes) -> str:
+    """
+    将 compact 格式的二进制摘要解码为指纹字符串（encode_fingerprint 的逆运算）。
+
+    Args:
+        data: 1 字节算法编号 + 原始摘要
+
+    Returns:
+        str: 指纹
+    """
+    algorithm = _DIGEST_ALGORITHM_NAMES[data[0]]
+    digest = data[1:].hex()
+    return digest if algorithm == "sha256" else f"{algorithm}:{digest}"
+
+
+def build_record(
+    request_id: str,
+    fingerprint: Optional[str],
+    status: str,
+    now: float,
+    ttl_seconds: int,
+    lease_seconds: int,
+    record_format: str = RECORD_FORMAT_LEGACY,
+    claim_token: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    构建幂等性记录。
+
+    Args:
+        request_id: 请求唯一 ID
+        fingerprint: 消息体指纹（可为 None）
+        status: 记录状态，IN_PROGRESS 记录带有租约
+        now: 当前时间（time.time()）
+        ttl_seconds: 记录保留时长（秒）
+        lease_seconds: 认领租约时长（秒）
+        record_format: 记录格式
+        claim_token: 认领令牌，写入 IN_PROGRESS 记录以识别认领者（可为 None）
+
+    Returns:
+        Dict: 待写入 DynamoDB 的记录
+    """
+    epoch_seconds = int(now)
+    if record_format == RECORD_FORMAT_COMPACT:
+        record: Dict[str, Any] = {"request_id": request_id, "t": epoch_seconds}
+        if fingerprint is not None:
+            record["d"] = encode_fingerprint(fingerprint)
+    else:
+        record = {
+            "request_id": request_id,
+            "processed_at": datetime.fromtimestamp(now, timezone.utc)
+            .replace(tzinfo=None)
+            .isoformat(),
+        }
+        if fingerprint is not None:
+            record["message_body_hash"] = fingerprint
+
+    record["ttl"] = epoch_seconds + ttl_seconds
+
+    if status == STATUS_IN_PROGRESS:
+        record["status"] = status
+        record["lease_until"] = epoch_seconds + lease_seconds
+        if claim_token is not None:
+            record["claim_token"] = claim_token
+    elif record_format == RECORD_FORMAT_LEGACY:
+        record["status"] = status
+    return record
+
+
+def _binary_value(value: Any) -> bytes:
+    """取出 Binary 属性的字节内容（boto3 读取时会包装为 Binary 对象）"""
+    return bytes(getattr(value, "value", value))
+
+
+def stored_fingerprint(item: Dict[str, Any]) -> Optional[str]:
+    """
+    读取记录中保存的消息体指纹（兼容两种格式）。
+
+    Args:
+        item: 已反序列化的记录
+
+    Returns:
+        str: 指纹，记录中没有指纹时返回 None
+    """
+    if "d" in item:
+        return decode_fingerprint(_binary_value(item["d"]))
+    return item.get("message_body_hash")
+
+
+def normalize_record(item: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    将任一格式的记录转换为 legacy 格式的字段，供 get_processed_record 的调用方使用。
+
+    Args:
+        item: 已反序列化的记录
+
+    Returns:
+        Dict: 包含 request_id、status、processed_at、ttl 以及（如有）
+            message_body_hash、lease_until 的记录
+    """
+    record = {
+        "request_id": item["request_id"],
+        # 没有 status 的记录（旧记录或 compact 格式的已完成记录）视为已完成
+        "status": item.get("status", STATUS_COMPLETED),
+    }
+
+    if "t" in item:
+        record["processed_at"] = (
+            datetime.fromtimestamp(int(item["t"]), timezone.utc)
+            .replace(tzinfo=None)
+            .isoformat()
+        )
+    elif "processed_at" in item:
+        record["processed_at"] = item["processed_at"]
+
+    fingerprint = stored_fingerprint(item)
+    if fingerprint is not None:
+        record["message_body_hash"] = fingerprint
+
+    for key in ("ttl", "lease_until"):
+        if key in item:
+            record[key] = int(item[key])
+    return record
@@ -0,0 +1,268 @@
+"""
+共享队列负载快照模块
+
+多个 Lambda 容器共享同一份队列负载快照：快照过期后只有抢到刷新租约的
+容器查询各 Region 的 SQS 队列属性并写回快照，其余容器只读取快照，
+从而将 GetQueueAttributes 调用量从“容器数 × Region 数”降为“Region 数”。
+
+快照记录同时保存全体容器路由到各 Region 的累计消息数（原子累加的计数器），
+刷新快照时一并记录采样时的累计值，相邻两份快照的差值即为期间全体容器
+路由进入各 Region 的消息数，用于估算消费速率。
+"""
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from decimal import Decimal
+from typing import Dict, Optional
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+import os
+
+logger = logging.getLogger(__name__)
+
+# DynamoDB 调用的连接和读取超时（秒）及 SDK 的最大尝试次数（与幂等性表相同），
+# 避免快照读写卡住时拖住路由
+DYNAMODB_CALL_TIMEOUT = float(os.environ.get("DYNAMODB_CALL_TIMEOUT", "2"))
+DYNAMODB_MAX_ATTEMPTS = int(os.environ.get("DYNAMODB_MAX_ATTEMPTS", "3"))
+
+# 快照在表中的主键值
+SNAPSHOT_ID = "queue-loads"
+
+# 各 Region 累计路由消息数计数器的属性名前缀（属性名为 “routed#<region>”）
+ROUTED_ATTRIBUTE_PREFIX = "routed#"
+
+
+class LoadSnapshotStore(ABC):
+    """
+    负载快照存储接口
+
+    快照格式: {"loads": {region: int}, "in_flight": {region: int}, "sampled_at": float,
+    "routed_totals": {region: int}}，routed_totals 为采样时全体容器的累计路由消息数
+    （旧快照可能没有该字段）
+    """
+
+    @abstractmethod
+    def read(self) -> Optional[Dict]:
+        """
+        读取当前快照。
+
+        Returns:
+            Dict: 快照，不存在时返回 None
+        """
+
+    @abstractmethod
+    def try_acquire_refresh(self, now: float, lease_seconds: float) -> bool:
+        """
+        尝试获取刷新租约（同一时间只有一个容器负责刷新）。
+
+        Args:
+            now: 当前时间
+            lease_seconds: 租约时长（秒）
+
+        Returns:
+            bool: True 表示获得租约
+        """
+
+    @abstractmethod
+    def write(self, snapshot: Dict) -> None:
+        """
+        写入新快照并释放刷新租约。
+
+        Args:
+            snapshot: 快照
+        """
+
+    @abstractmethod
+    def add_routed(self, counts: Dict[str, int]) -> None:
+        """
+        将本容器路由到各 Region 的消息数原子累加到全体容器的计数器。
+
+        Args:
+            counts: Region 到消息数的映射（可为负数，用于撤回未发送的消息）
+        """
+
+    @abstractmethod
+    def routed_totals(self) -> Dict[str, int]:
+        """
+        读取全体容器路由到各 Region 的累计消息数（强一致读取）。
+
+        Returns:
+            Dict[str, int]: Region 到累计消息数的映射
+        """
+
+
+class InMemoryLoadSnapshotStore(LoadSnapshotStore):
+    """进程内快照存储（用于单元测试和本地模拟，行为与 DynamoDBLoadSnapshotStore 一致）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[Dict] = None
+        self._lease_until = 0.0
+        self._routed: Dict[str, int] = {}
+
+    def read(self) -> Optional[Dict]:
+        with self._lock:
+            return dict(self._snapshot) if self._snapshot else None
+
+    def try_acquire_refresh(self, now: float, lease_seconds: float) -> bool:
+        with self._lock:
+            if self._lease_until > now:
+                return False
+            self._lease_until = now + lease_seconds
+            return True
+
+    def write(self, snapshot: Dict) -> None:
+        with self._lock:
+            self._snapshot = dict(snapshot)
+            self._lease_until = 0.0
+
+    def add_routed(self, counts: Dict[str, int]) -> None:
+        with self._lock:
+            for region, count in counts.items():
+                self._routed[region] = self._routed.get(region, 0) + count
+
+    def routed_totals(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._routed)
+
+
+class DynamoDBLoadSnapshotStore(LoadSnapshotStore):
+    """基于 DynamoDB 单条记录的快照存储"""
+
+    def __init__(self, table_name: str):
+        dynamodb = boto3.resource(
+            "dynamodb",
+            config=Config(
+                connect_timeout=DYNAMODB_CALL_TIMEOUT,
+                read_timeout=DYNAMODB_CALL_TIMEOUT,
+                retries={"mode": "standard", "total_max_attempts": DYNAMODB_MAX_ATTEMPTS},
+            ),
+        )
+        self.table = dynamodb.Table(table_name)
+
+    def read(self) -> Optional[Dict]:
+        # 最终一致性读取，单条小记录只消耗 0.5 RCU
+        response = self.table.get_item(
+            Key={"snapshot_id": SNAPSHOT_ID},
+            ProjectionExpression="loads, in_flight, sampled_at, routed_totals",
+        )
+        item = response.get("Item")
+        if not item or "sampled_at" not in item:
+            return None
+
+        snapshot = {
+            "loads": {region: int(depth) for region, depth in item["loads"].items()},
+            "in_flight": {
+                region: int(count) for region, count in item.get("in_flight", {}).items()
+            },
+            "sampled_at": float(item["sampled_at"]),
+        }
+        if "routed_totals" in item:
+            snapshot["routed_totals"] = {
+                region: int(count) for region, count in item["routed_totals"].items()
+            }
+        return snapshot
+
+    def try_acquire_refresh(self, now: float, lease_seconds: float) -> bool:
+        try:
+            self.table.update_item(
+                Key={"snapshot_id": SNAPSHOT_ID},
+                UpdateExpression="SET refresh_lease_until = :lease_until",
+                ConditionExpression=(
+                    "attribute_not_exists(refresh_lease_until) "
+                    "OR refresh_lease_until < :now"
+                ),
+                ExpressionAttributeValues={
+                    ":lease_until": Decimal(str(now + lease_seconds)),
+                    ":now": Decimal(str(now)),
+                },
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                return False
+            raise
+
+    def write(self, snapshot: Dict) -> None:
+        self.table.update_item(
+            Key={"snapshot_id": SNAPSHOT_ID},
+            UpdateExpression=(
+                "SET loads = :loads, in_flight = :in_flight, "
+                "sampled_at = :sampled_at, routed_totals = :routed_totals, "
+                "refresh_lease_until = :released"
+            ),
+            ExpressionAttributeValues={
+                ":loads": snapshot["loads"],
+                ":in_flight": snapshot["in_flight"],
+                ":sampled_at": Decimal(str(snapshot["sampled_at"])),
+                ":routed_totals": snapshot.get("routed_totals", {}),
+                ":released": Decimal(0),
+            },
+        )
+
+    def add_routed(self, counts: Dict[str, int]) -> None:
+        counts = {region: count for region, count in counts.items() if count}
+        if not counts:
+            return
+
+        # 顶层数值属性的 ADD 在属性不存在时从 0 开始累加
+        clauses = []
+        names = {}
+        values = {}
+        for index, (region, count) in enumerate(counts.items()):
+            clauses.append(f"#r{index} :r{index}")
+            names[f"#r{index}"] = f"{ROUTED_ATTRIBUTE_PREFIX}{region}"
+            values[f":r{index}"] = count
+        self.table.update_item(
+            Key={"snapshot_id": SNAPSHOT_ID},
+            UpdateExpression="ADD " + ", ".join(clauses),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    def routed_totals(self) -> Dict[str, int]:
+        response = self.table.get_item(
+            Key={"snapshot_id": SNAPSHOT_ID}, ConsistentRead=True
+        )
+        item = response.get("Item") or {}
+        return {
+            name[len(ROUTED_ATTRIBUTE_PREFIX):]: int(value)
+            for name, value in item.items()
+            if name.startswith(ROUTED_ATTRIBUTE_PREFIX)
+        }
+
+
+def create_load_snapshot_store(table_name: str) -> Optional[LoadSnapshotStore]:
+    """
+    根据配置创建快照存储。
+
+    Args:
+        table_name: DynamoDB 表名，为空时不启用共享快照
+
+    Returns:
+        LoadSnapshotStore: 快照存储，未启用时返回 None
+    """
+    if not table_name:
+        return None
+
+    logger.info("启用共享队列负载快照: %s", table_name)
+    return DynamoDBLoadSnapshotStore(table_name)
+
+
+def snapshot_age(snapshot: Optional[Dict], now: Optional[float] = None) -> float:
+    """
+    计算快照年龄（秒），快照不存在时返回无穷大。
+
+    Args:
+        snapshot: 快照
+        now: 当前时间（默认取 time.time()）
+
+    Returns:
+        float: 快照年龄
+    """
+    if not snapshot:
+        return float("inf")
+    return (now if now is not None else time.time()) - snapshot["sampled_at"]
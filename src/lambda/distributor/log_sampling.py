@@ -0,0 +1,44 @@
+"""
+日志采样模块
+
+逐条消息的日志（认领结果、路由目标等）默认只在 DEBUG 级别输出。
+LOG_SAMPLE_RATE 大于 0 时按该比例抽样整次调用，被抽中的调用以 INFO 级别输出
+逐条消息的日志，便于在不开启 DEBUG 的情况下排查问题。
+
+本模块不依赖 AWS SDK，可在本地基准测试中直接使用。
+"""
+import logging
+import os
+import random
+
+# 以 INFO 级别输出逐条消息日志的调用比例（0~1，0 表示只在 DEBUG 级别输出）
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0"))
+
+# 当前调用是否被抽中（每个容器同时只处理一次调用）
+_sampled = False
+
+
+def start_invocation() -> bool:
+    """
+    在每次调用开始时决定是否抽样本次调用。
+
+    Returns:
+        bool: True 表示本次调用输出逐条消息日志
+    """
+    global _sampled
+    _sampled = LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE
+    return _sampled
+
+
+def log_record(logger: logging.Logger, msg: str, *args) -> None:
+    """
+    输出一条逐条消息日志：抽中的调用使用 INFO 级别，否则使用 DEBUG 级别。
+
+    参数按 logging 的 % 格式延迟格式化，未输出时没有格式化开销。
+
+    Args:
+        logger: 日志记录器
+        msg: 日志格式字符串
+        *args: 格式化参数
+    """
+    logger.log(logging.INFO if _sampled else logging.DEBUG, msg, *args)
@@ -0,0 +1,116 @@
+"""
+指标上报模块
+
+使用 CloudWatch Embedded Metric Format (EMF) 将指标写入日志，
+由 CloudWatch Logs 自动提取为自定义指标，无需额外的 API 调用。
+
+调用期间其他模块产生的指标（如队列负载刷新、熔断器打开）通过
+add_invocation_metrics 暂存，随调用摘要写入同一条日志。
+"""
+import os
+import json
+import time
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# 指标命名空间
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", "InferenceOrchestrator")
+
+# 等待随下一条调用摘要输出的指标和属性（后台线程产生的指标同样计入下一次调用）
+_invocation_metrics: Dict[str, Tuple[float, str]] = {}
+_invocation_properties: Dict[str, List[Any]] = {}
+_invocation_lock = threading.Lock()
+
+
+def put_metrics(
+    metrics: Dict[str, Tuple[float, str]],
+    dimensions: Optional[Dict[str, str]] = None,
+    properties: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    以 EMF 格式输出一组指标。
+
+    Args:
+        metrics: 指标名到 (数值, 单位) 的映射，单位如 "Count"、"Milliseconds"
+        dimensions: 指标维度（可选）
+        properties: 随指标写入同一条日志的其他属性（不提取为指标，可在
+            CloudWatch Logs Insights 中查询，可选）
+    """
+    if not metrics:
+        return
+
+    dimensions = dimensions or {}
+    document = {
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [list(dimensions.keys())],
+                    "Metrics": [
+                        {"Name": name, "Unit": unit}
+                        for name, (_, unit) in metrics.items()
+                    ],
+                }
+            ],
+        },
+        **(properties or {}),
+        **dimensions,
+    }
+    for name, (value, _) in metrics.items():
+        document[name] = value
+
+    # Lambda 的标准输出会写入 CloudWatch Logs
+    print(json.dumps(document, ensure_ascii=False))
+
+
+def put_metric(
+    name: str,
+    value: float,
+    unit: str = "Count",
+    dimensions: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    以 EMF 格式输出单个指标。
+
+    Args:
+        name: 指标名
+        value: 指标值
+        unit: 指标单位
+        dimensions: 指标维度（可选）
+    """
+    put_metrics({name: (value, unit)}, dimensions)
+
+
+def add_invocation_metrics(
+    metrics: Dict[str, Tuple[float, str]],
+    properties: Optional[Dict[str, Any]] = None,
+) -> None:
+    """
+    暂存一组指标，随下一条调用摘要输出（同名指标的数值累加）。
+
+    Args:
+        metrics: 指标名到 (数值, 单位) 的映射
+        properties: 随摘要输出的属性，值追加到同名列表中（可选）
+    """
+    with _invocation_lock:
+        for name, (value, unit) in metrics.items():
+            previous = _invocation_metrics.get(name, (0, unit))[0]
+            _invocation_metrics[name] = (previous + value, unit)
+        for name, value in (properties or {}).items():
+            _invocation_properties.setdefault(name, []).append(value)
+
+
+def take_invocation_metrics() -> Tuple[Dict[str, Tuple[float, str]], Dict[str, List[Any]]]:
+    """
+    取出并清空暂存的指标和属性。
+
+    Returns:
+        Tuple: (指标名到 (数值, 单位) 的映射, 属性名到值列表的映射)
+    """
+    global _invocation_metrics, _invocation_properties
+
+    with _invocation_lock:
+        metrics, _invocation_metrics = _invocation_metrics, {}
+        properties, _invocation_properties = _invocation_properties, {}
+    return metrics, properties
@@ -1,14 +1,33 @@
 """
 队列选择模块
 
-实现负载感知的队列选择算法，使用反向权重策略。
+实现负载感知的队列选择算法，默认使用反向权重策略。
 负载越低的队列，权重越高，被选中的概率越大。
+其他可选策略见 routing_strategies 模块。
+
+每个 Region 有一个熔断器（见 circuit_breaker 模块），由队列属性查询和
+消息发送的结果驱动：熔断中的 Region 不参与路由，半开的 Region 只接收少量探测流量。
 """
 import time
 import random
 import logging
-from typing import Dict, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from typing import Dict, Iterable, List, Optional, Tuple
 import boto3
+from botocore.config import Config
+
+from circuit_breaker import (
+    RegionCircuitBreakers,
+    SIGNAL_ATTRIBUTES,
+    SIGNAL_SEND,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+)
+from load_store import create_load_snapshot_store, snapshot_age
+from metrics import add_invocation_metrics
+from routing_strategies import create_strategy, inverse_weights
 
 import os
 import json as json_module
@@ -18,86 +37,596 @@ logger = logging.getLogger(__name__)
 # 全局缓存变量（Lambda 容器复用时保持）
 queue_load_cache: Dict[str, int] = {}
 cache_timestamp: float = 0.0
+# 缓存数据的采样时间（用于估算消费速率；使用共享快照时 cache_timestamp 会被调整以控制重新读取时机）
+sample_timestamp: float = 0.0
+
+# 各 Region 处理中（不可见）的消息数，与 queue_load_cache 同时刷新
+queue_in_flight: Dict[str, int] = {}
+
+# 各 Region 估算的消费速率（条/秒），由相邻两次采样计算
+drain_rates: Dict[str, float] = {}
+
+# 本容器自上次刷新以来路由到各 Region 的消息数
+# 缓存的队列深度最多陈旧 CACHE_TTL 秒，计算权重时叠加该计数，避免突发流量集中到同一 Region
+routed_since_refresh: Dict[str, int] = {}
+_routed_lock = threading.Lock()
+
+# 启用共享快照时，尚未累加到全体容器计数器的路由消息数（由 _routed_lock 保护）
+_unflushed_routed: Dict[str, int] = {}
+# 当前缓存样本对应的全体容器累计路由消息数（None 表示未知，不更新消费速率）
+last_routed_totals: Optional[Dict[str, int]] = None
+
+# 刷新状态（每个容器同时最多一个刷新在进行，后台和同步刷新都不例外；
+# 两个刷新并发应用样本会把同一批路由消息数扣减两次）
+_refresh_lock = threading.Lock()
+_refresh_done = threading.Condition(_refresh_lock)
+_refresh_in_flight: bool = False
+
+# SQS 调用的连接和读取超时（秒），避免跨 Region 调用卡住时耗尽整个调用时间
+SQS_CALL_TIMEOUT = float(os.environ.get("SQS_CALL_TIMEOUT", "5"))
+# SDK 的最大尝试次数（含首次调用）。legacy 重试模式默认最多 5 次，
+# 单次调用最长可能持续 SQS_CALL_TIMEOUT × SQS_MAX_ATTEMPTS 秒
+SQS_MAX_ATTEMPTS = int(os.environ.get("SQS_MAX_ATTEMPTS", "2"))
 
 # 全局 SQS 客户端
-sqs_client = boto3.client("sqs")
+sqs_client = boto3.client(
+    "sqs",
+    config=Config(
+        connect_timeout=SQS_CALL_TIMEOUT,
+        read_timeout=SQS_CALL_TIMEOUT,
+        retries={"mode": "standard", "total_max_attempts": SQS_MAX_ATTEMPTS},
+    ),
+)
 
 # 从环境变量读取配置
 CACHE_TTL = int(os.environ.get("CACHE_TTL", "60"))
 MAX_QUEUE_DEPTH_THRESHOLD = int(os.environ.get("MAX_QUEUE_DEPTH_THRESHOLD", "5000"))
 REGION_QUEUES = json_module.loads(os.environ.get("REGION_QUEUES", "{}"))
+# 缓存最大陈旧时间（秒），大于 CACHE_TTL 时启用 stale-while-revalidate
+CACHE_MAX_STALENESS = int(os.environ.get("CACHE_MAX_STALENESS", "0"))
+# 计算权重时是否叠加本容器自上次刷新以来路由的消息数
+ROUTED_LOAD_ACCOUNTING = (
+    os.environ.get("ROUTED_LOAD_ACCOUNTING", "true").lower() == "true"
+)
+# 路由策略（见 routing_strategies.STRATEGIES）
+ROUTING_STRATEGY = os.environ.get("ROUTING_STRATEGY", "inverse_weight")
+# 路由代价: depth（按积压深度）/ drain_time（按估算排空时间）
+ROUTING_COST = os.environ.get("ROUTING_COST", "depth")
+# 消费速率的平滑系数（指数加权移动平均，越大越偏向最新样本）
+DRAIN_RATE_SMOOTHING = float(os.environ.get("DRAIN_RATE_SMOOTHING", "0.3"))
+# 估算排空时间时使用的最小消费速率（条/秒），避免除零
+MIN_DRAIN_RATE = 0.1
+# 单次刷新中查询队列属性的超时时间（秒）
+QUEUE_ATTRIBUTES_TIMEOUT = float(os.environ.get("QUEUE_ATTRIBUTES_TIMEOUT", "2"))
+
+# 熔断器：连续失败次数阈值、打开后进入半开的等待时间（秒）、半开时探测流量占批次的比例
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "3"))
+CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+CIRCUIT_PROBE_SHARE = float(os.environ.get("CIRCUIT_PROBE_SHARE", "0.1"))
+
+# 共享队列负载快照（为空时每个容器各自查询 SQS）
+LOAD_SNAPSHOT_TABLE_NAME = os.environ.get("LOAD_SNAPSHOT_TABLE_NAME", "")
+# 刷新租约在查询超时之外预留的时间（秒）
+SHARED_REFRESH_LEASE_MARGIN = 3.0
+# 其他容器正在刷新快照时，重新读取快照的间隔（秒）
+SHARED_SNAPSHOT_RECHECK = 1.0
+
+# 共享快照存储（Lambda 容器复用时保持）
+load_snapshot_store = create_load_snapshot_store(LOAD_SNAPSHOT_TABLE_NAME)
+
+# 各 Region 的熔断器（Lambda 容器复用时保持）
+circuit_breakers = RegionCircuitBreakers(CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT)
+
+# 路由策略实例（Lambda 容器复用时保持，供有状态的策略使用）
+routing_strategy = create_strategy(ROUTING_STRATEGY)
+
+# 并发查询各 Region 队列属性的线程池（Lambda 容器复用时保持）
+# 预留一倍线程，避免超时未返回的查询占满线程池拖慢下一次刷新
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=max(1, 2 * len(REGION_QUEUES)),
+    thread_name_prefix="queue-load",
+)
+
+
+def _fetch_queue_depth(queue_url: str) -> Tuple[int, int]:
+    """
+    查询单个子队列的消息数。
+
+    Args:
+        queue_url: 子队列 URL
+
+    Returns:
+        Tuple[int, int]: (可见消息数, 处理中的不可见消息数)
+    """
+    response = sqs_client.get_queue_attributes(
+        QueueUrl=queue_url,
+        AttributeNames=[
+            "ApproximateNumberOfMessages",
+            "ApproximateNumberOfMessagesNotVisible",
+        ]
+    )
+    attributes = response["Attributes"]
+    return (
+        int(attributes["ApproximateNumberOfMessages"]),
+        int(attributes.get("ApproximateNumberOfMessagesNotVisible", 0)),
+    )
 
 
 def get_queue_loads(force_refresh: bool = False) -> Dict[str, int]:
     """
     获取所有子队列的负载（带缓存）。
 
+    启用 stale-while-revalidate（CACHE_MAX_STALENESS > CACHE_TTL）时，缓存过期后
+    先返回旧数据并在后台线程刷新；缓存年龄超过 CACHE_MAX_STALENESS 时才同步刷新。
+    同步刷新时后台刷新仍在进行，则等待其完成并使用其结果。
+
     Args:
         force_refresh: 是否强制刷新缓存
 
     Returns:
         Dict[str, int]: 队列 region 到消息数的映射
     """
-    global queue_load_cache, cache_timestamp
-
     current_time = time.time()
+    cache_age = current_time - cache_timestamp
 
     # 如果缓存未过期且不强制刷新，直接返回
-    if not force_refresh and (current_time - cache_timestamp < CACHE_TTL):
-        logger.debug(
-            f"使用缓存的队列负载数据（缓存时间: {current_time - cache_timestamp:.2f}s）"
-        )
+    if not force_refresh and cache_age < CACHE_TTL:
+        logger.debug("使用缓存的队列负载数据（缓存时间: %.2fs）", cache_age)
         return queue_load_cache
 
-    # 刷新缓存
-    logger.info("刷新队列负载缓存...")
-    queue_loads = {}
+    # 缓存已过期但未超过最大陈旧时间：返回旧数据，后台刷新
+    if not force_refresh and queue_load_cache and cache_age < CACHE_MAX_STALENESS:
+        logger.debug("使用陈旧的队列负载数据并触发后台刷新（缓存时间: %.2fs）", cache_age)
+        _start_background_refresh()
+        return queue_load_cache
+
+    return _refresh_exclusively()
+
+
+def _refresh_exclusively() -> Dict[str, int]:
+    """同步刷新；已有刷新在进行时等待其完成，期间缓存已更新则直接使用，否则接手刷新"""
+    global _refresh_in_flight
+
+    requested_at = time.time()
+    with _refresh_lock:
+        while _refresh_in_flight:
+            _refresh_done.wait()
+            if cache_timestamp >= requested_at:
+                return queue_load_cache
+        _refresh_in_flight = True
+
+    try:
+        return refresh_queue_loads()
+    finally:
+        with _refresh_lock:
+            _refresh_in_flight = False
+            _refresh_done.notify_all()
+
 
-    for region, queue_url in REGION_QUEUES.items():
+def _start_background_refresh() -> None:
+    """启动后台刷新线程（每个容器同时最多一个）"""
+    global _refresh_in_flight
+
+    with _refresh_lock:
+        if _refresh_in_flight:
+            return
+        _refresh_in_flight = True
+
+    threading.Thread(
+        target=_background_refresh, name="queue-load-refresher", daemon=True
+    ).start()
+
+
+def _background_refresh() -> None:
+    """后台刷新队列负载缓存"""
+    global _refresh_in_flight
+
+    try:
+        refresh_queue_loads()
+    except Exception as e:
+        logger.error("后台刷新队列负载缓存失败: %s", e, exc_info=True)
+    finally:
+        with _refresh_lock:
+            _refresh_in_flight = False
+            _refresh_done.notify_all()
+
+
+def refresh_queue_loads() -> Dict[str, int]:
+    """
+    同步刷新所有子队列的负载，并更新全局缓存（调用方需保证同时只有一个刷新）。
+
+    启用共享快照（LOAD_SNAPSHOT_TABLE_NAME）时优先使用共享快照，
+    读取失败时退化为直接查询 SQS。
+
+    Returns:
+        Dict[str, int]: 队列 region 到消息数的映射
+    """
+    if load_snapshot_store is not None:
         try:
-            response = sqs_client.get_queue_attributes(
-                QueueUrl=queue_url,
-                AttributeNames=["ApproximateNumberOfMessages"]
+            return _refresh_from_shared_snapshot()
+        except Exception as e:
+            logger.error(
+                "使用共享队列负载快照失败，改为直接查询 SQS: %s", e,
+                exc_info=True
             )
-            queue_depth = int(
-                response["Attributes"]["ApproximateNumberOfMessages"]
+
+    routed_at_start = _copy_routed()
+    queue_loads, in_flight, fetched = _sample_queue_attributes()
+    # 采样完成后再取时间：后台刷新线程可能在两次调用之间被冻结，
+    # 采样前的时间会让缓存年龄和消费速率的时间间隔失真
+    _apply_sample(queue_loads, in_flight, fetched, time.time(), routed_at_start)
+    return queue_loads
+
+
+def _refresh_from_shared_snapshot() -> Dict[str, int]:
+    """
+    从共享快照刷新队列负载。
+
+    快照未过期时直接使用；过期时尝试获取刷新租约，获得租约的容器查询 SQS
+    并写回快照，其余容器沿用旧快照并在 SHARED_SNAPSHOT_RECHECK 秒后重新读取。
+
+    Returns:
+        Dict[str, int]: 队列 region 到消息数的映射
+    """
+    global cache_timestamp
+
+    _flush_routed()
+    current_time = time.time()
+    snapshot = load_snapshot_store.read()
+
+    if snapshot_age(snapshot, current_time) < CACHE_TTL:
+        _apply_snapshot(snapshot)
+        return queue_load_cache
+
+    lease_seconds = QUEUE_ATTRIBUTES_TIMEOUT + SHARED_REFRESH_LEASE_MARGIN
+    if load_snapshot_store.try_acquire_refresh(current_time, lease_seconds):
+        routed_at_start = _copy_routed()
+        queue_loads, in_flight, fetched = _sample_queue_attributes()
+        sampled_at = time.time()
+        routed_totals = load_snapshot_store.routed_totals()
+        _apply_sample(
+            queue_loads, in_flight, fetched, sampled_at, routed_at_start, routed_totals
+        )
+        load_snapshot_store.write({
+            "loads": queue_loads,
+            "in_flight": in_flight,
+            "sampled_at": sampled_at,
+            "routed_totals": routed_totals,
+        })
+        logger.debug("已更新共享队列负载快照")
+        return queue_loads
+
+    # 其他容器正在刷新
+    if snapshot:
+        _apply_snapshot(snapshot)
+    elif not queue_load_cache:
+        # 没有任何可用数据时直接查询 SQS，但不写回快照
+        routed_at_start = _copy_routed()
+        queue_loads, in_flight, fetched = _sample_queue_attributes()
+        _apply_sample(queue_loads, in_flight, fetched, time.time(), routed_at_start)
+        return queue_loads
+
+    cache_timestamp = current_time - CACHE_TTL + SHARED_SNAPSHOT_RECHECK
+    return queue_load_cache
+
+
+def _apply_snapshot(snapshot: Dict) -> None:
+    """
+    将共享快照应用到本地缓存（快照比本地数据新时）。
+
+    Args:
+        snapshot: 共享快照
+    """
+    if snapshot["sampled_at"] <= sample_timestamp:
+        return
+
+    queue_loads = {
+        region: depth
+        for region, depth in snapshot["loads"].items()
+        if region in REGION_QUEUES
+    }
+    in_flight = {
+        region: snapshot["in_flight"].get(region, 0) for region in queue_loads
+    }
+    _apply_sample(
+        queue_loads, in_flight, set(queue_loads), snapshot["sampled_at"], _copy_routed(),
+        snapshot.get("routed_totals"),
+    )
+
+
+def _flush_routed() -> None:
+    """将本容器尚未累加的路由消息数写入全体容器的计数器（失败时保留到下次）"""
+    global _unflushed_routed
+
+    with _routed_lock:
+        counts, _unflushed_routed = _unflushed_routed, {}
+    if not counts:
+        return
+
+    try:
+        load_snapshot_store.add_routed(counts)
+    except Exception as e:
+        logger.error("累加全体容器路由计数失败: %s", e, exc_info=True)
+        with _routed_lock:
+            for region, count in counts.items():
+                _unflushed_routed[region] = _unflushed_routed.get(region, 0) + count
+
+
+def _copy_routed() -> Dict[str, int]:
+    """返回当前路由计数的副本（作为刷新开始时的基线）"""
+    with _routed_lock:
+        return dict(routed_since_refresh)
+
+
+def _sample_queue_attributes() -> Tuple[Dict[str, int], Dict[str, int], set]:
+    """
+    并发查询所有 Region 的队列属性，单个 Region 超时不阻塞整批。
+
+    Returns:
+        Tuple: (可见消息数, 处理中消息数, 成功采样的 Region 集合)，
+            采样失败的 Region 沿用上次缓存值；没有缓存值时不包含该 Region，
+            避免故障 Region 看起来像空队列而吸引流量
+    """
+    logger.debug("刷新队列负载缓存...")
+    refresh_start = time.monotonic()
+    deadline = refresh_start + QUEUE_ATTRIBUTES_TIMEOUT
+    queue_loads = {}
+    in_flight = {}
+    fetched = set()
+    timeouts = 0
+
+    futures = {
+        region: _refresh_executor.submit(_fetch_queue_depth, queue_url)
+        for region, queue_url in REGION_QUEUES.items()
+    }
+
+    for region, future in futures.items():
+        try:
+            queue_depth, not_visible = future.result(
+                timeout=max(0.0, deadline - time.monotonic())
             )
             queue_loads[region] = queue_depth
-            logger.info(f"Region {region} 队列深度: {queue_depth}")
+            in_flight[region] = not_visible
+            fetched.add(region)
+            record_region_success(region, SIGNAL_ATTRIBUTES)
+            logger.debug(
+                "Region %s 队列深度: %d，处理中: %d", region, queue_depth, not_visible
+            )
+
+        except FuturesTimeoutError:
+            timeouts += 1
+            logger.warning(
+                "获取 Region %s 队列属性超时（%ss），使用上次缓存值",
+                region, QUEUE_ATTRIBUTES_TIMEOUT
+            )
+            record_region_failure(region, SIGNAL_ATTRIBUTES)
+            _keep_cached_load(region, queue_loads, in_flight)
 
         except Exception as e:
             logger.error(
-                f"获取 Region {region} 队列属性失败: {str(e)}",
+                "获取 Region %s 队列属性失败: %s", region, e,
                 exc_info=True
             )
-            # 发生错误时使用上次缓存值或默认值 0
-            queue_loads[region] = queue_load_cache.get(region, 0)
+            record_region_failure(region, SIGNAL_ATTRIBUTES)
+            _keep_cached_load(region, queue_loads, in_flight)
+
+    add_invocation_metrics({
+        "QueueLoadRefreshes": (1, "Count"),
+        "QueueLoadRefreshDuration": (
+            (time.monotonic() - refresh_start) * 1000, "Milliseconds"
+        ),
+        "QueueLoadRefreshTimeouts": (timeouts, "Count"),
+    })
+
+    return queue_loads, in_flight, fetched
+
+
+def _keep_cached_load(
+    region: str, queue_loads: Dict[str, int], in_flight: Dict[str, int]
+) -> None:
+    """采样失败时沿用 Region 的上次缓存值（没有缓存值时不填充）"""
+    if region in queue_load_cache:
+        queue_loads[region] = queue_load_cache[region]
+        in_flight[region] = queue_in_flight.get(region, 0)
+
+
+def _apply_sample(
+    queue_loads: Dict[str, int],
+    in_flight: Dict[str, int],
+    fetched: set,
+    sampled_at: float,
+    routed_at_start: Dict[str, int],
+    routed_totals: Optional[Dict[str, int]] = None,
+) -> None:
+    """
+    用一次采样更新全局缓存、消费速率和路由计数。
+
+    Args:
+        queue_loads: 可见消息数
+        in_flight: 处理中消息数
+        fetched: 成功采样的 Region
+        sampled_at: 采样时间
+        routed_at_start: 采样开始时本容器的路由计数
+        routed_totals: 采样时全体容器的累计路由消息数（来自共享快照，
+            None 表示未知，此时不更新消费速率）
+    """
+    global queue_load_cache, queue_in_flight, cache_timestamp, sample_timestamp
+    global routed_since_refresh, last_routed_totals
+
+    # 根据相邻两次采样之间全体容器的到达量更新各 Region 的消费速率
+    if routed_totals is not None and last_routed_totals is not None:
+        arrivals = {
+            region: routed_totals.get(region, 0) - last_routed_totals.get(region, 0)
+            for region in fetched
+        }
+        _update_drain_rates(queue_loads, in_flight, fetched, arrivals, sampled_at)
+    last_routed_totals = routed_totals
 
     # 更新全局缓存
     queue_load_cache = queue_loads
-    cache_timestamp = current_time
+    queue_in_flight = in_flight
+    cache_timestamp = sampled_at
+    sample_timestamp = sampled_at
+
+    # 只保留采样开始之后路由的消息数
+    with _routed_lock:
+        routed_since_refresh = {
+            region: count - routed_at_start.get(region, 0)
+            for region, count in routed_since_refresh.items()
+            if count > routed_at_start.get(region, 0)
+        }
+
+
+def _update_drain_rates(
+    queue_loads: Dict[str, int],
+    in_flight: Dict[str, int],
+    fetched: set,
+    arrivals: Dict[str, int],
+    sampled_at: float,
+) -> None:
+    """
+    根据相邻两次采样估算各 Region 的消费速率（指数加权移动平均）。
 
-    return queue_loads
+    消费量 = 上次积压 + 期间全体容器路由进入的消息 - 本次积压，积压包含处理中的
+    消息。各容器每次刷新时才累加路由计数，计数滞后最多一个 CACHE_TTL，
+    单个样本的误差由平滑抵消。
 
+    Args:
+        queue_loads: 本次采样的可见消息数
+        in_flight: 本次采样的处理中消息数
+        fetched: 本次成功采样的 Region
+        arrivals: 上次采样以来全体容器路由到各 Region 的消息数
+        sampled_at: 本次采样时间
+    """
+    elapsed = sampled_at - sample_timestamp
+    if sample_timestamp <= 0 or elapsed <= 0:
+        return
+
+    for region in fetched:
+        if region not in queue_load_cache:
+            continue
+
+        previous_backlog = queue_load_cache[region] + queue_in_flight.get(region, 0)
+        current_backlog = queue_loads[region] + in_flight[region]
+        consumed = previous_backlog + arrivals.get(region, 0) - current_backlog
+        sample = max(0.0, consumed / elapsed)
+
+        if region in drain_rates:
+            drain_rates[region] = (
+                DRAIN_RATE_SMOOTHING * sample
+                + (1 - DRAIN_RATE_SMOOTHING) * drain_rates[region]
+            )
+        else:
+            drain_rates[region] = sample
 
-def calculate_weights(queue_loads: Dict[str, int]) -> Dict[str, float]:
+        logger.debug("Region %s 估算消费速率: %.2f 条/秒", region, drain_rates[region])
+
+
+def get_drain_costs(queue_loads: Dict[str, int]) -> Dict[str, float]:
     """
-    计算反向权重：负载越低，权重越高。
+    按估算的排空时间计算各 Region 的路由代价。
 
-    使用公式: weight = max(1, max_depth - current_depth + 1)
-    然后归一化权重，使总和为 1。
+    排空时间 = (可见消息 + 处理中消息 + 本容器新路由的消息) / 消费速率。
+    为了与基于深度的策略使用相同的量纲，结果换算为“按平均消费速率排空
+    同样时间所对应的消息数”。尚无消费速率样本的 Region 使用已知 Region 的
+    平均速率；所有 Region 都没有样本时等价于按积压深度路由。
+
+    Args:
+        queue_loads: 队列 region 到估算消息数的映射（已包含本容器新路由的消息）
+
+    Returns:
+        Dict[str, float]: 队列 region 到路由代价的映射
+    """
+    known_rates = [
+        max(drain_rates[region], MIN_DRAIN_RATE)
+        for region in queue_loads if region in drain_rates
+    ]
+    mean_rate = sum(known_rates) / len(known_rates) if known_rates else 1.0
+
+    costs = {}
+    for region, depth in queue_loads.items():
+        rate = max(drain_rates.get(region, mean_rate), MIN_DRAIN_RATE)
+        backlog = depth + queue_in_flight.get(region, 0)
+        costs[region] = backlog * mean_rate / rate
+
+    return costs
+
+
+def record_routed(region: str, count: int = 1) -> None:
+    """
+    记录本容器路由到某个 Region 的消息数。
+
+    启用共享快照时同时计入待累加的全体容器计数，下次刷新时写入快照记录。
+
+    Args:
+        region: 目标 Region
+        count: 消息数
+    """
+    with _routed_lock:
+        routed_since_refresh[region] = routed_since_refresh.get(region, 0) + count
+        if load_snapshot_store is not None:
+            _unflushed_routed[region] = _unflushed_routed.get(region, 0) + count
+
+
+def record_region_success(region: str, signal: str = SIGNAL_SEND) -> None:
+    """
+    记录对 Region 的一次成功调用（队列属性查询或消息发送）。
+
+    Args:
+        region: Region
+        signal: SIGNAL_SEND（消息发送，默认）或 SIGNAL_ATTRIBUTES（队列属性查询）
+    """
+    circuit_breakers.record_success(region, signal)
+
+
+def record_region_failure(region: str, signal: str = SIGNAL_SEND) -> None:
+    """
+    记录对 Region 的一次失败调用（队列属性查询或消息发送），
+    熔断器因此打开时随调用摘要上报 CircuitOpened 指标和打开的 Region。
+
+    Args:
+        region: Region
+        signal: SIGNAL_SEND（消息发送，默认）或 SIGNAL_ATTRIBUTES（队列属性查询）
+    """
+    if circuit_breakers.record_failure(region, signal):
+        add_invocation_metrics({"CircuitOpened": (1, "Count")}, {"circuit_opened": region})
+
+
+def get_effective_queue_loads() -> Dict[str, int]:
+    """
+    获取用于计算权重的队列负载：缓存深度加上本容器自上次刷新以来路由的消息数。
+
+    Returns:
+        Dict[str, int]: 队列 region 到估算消息数的映射
+    """
+    queue_loads = get_queue_loads()
+    if not ROUTED_LOAD_ACCOUNTING:
+        return queue_loads
+
+    with _routed_lock:
+        return {
+            region: depth + routed_since_refresh.get(region, 0)
+            for region, depth in queue_loads.items()
+        }
+
+
+def get_available_queues(queue_loads: Dict[str, int]) -> Dict[str, int]:
+    """
+    过滤掉过载和熔断中的队列。
+
+    熔断器打开的 Region 不可用；半开的 Region 只通过探测流量使用
+    （见 get_target_queue_urls），除非没有熔断器关闭的 Region 可用。
 
     Args:
         queue_loads: 队列 region 到消息数的映射
 
     Returns:
-        Dict[str, float]: 队列 region 到归一化权重的映射
+        Dict[str, int]: 未过载队列 region 到消息数的映射
     """
     if not queue_loads:
         logger.error("队列负载数据为空，无法计算权重")
         return {}
 
-    # 过滤掉过载的队列
     available_queues = {
         region: depth
         for region, depth in queue_loads.items()
@@ -105,28 +634,48 @@ def calculate_weights(queue_loads: Dict[str, int]) -> Dict[str, float]:
     }
 
     if not available_queues:
-        logger.error(
-            f"所有队列都已过载（阈值: {MAX_QUEUE_DEPTH_THRESHOLD}）"
-        )
-        return {}
-
-    # 计算反向权重
-    max_depth = max(available_queues.values())
+        logger.error("所有队列都已过载（阈值: %d）", MAX_QUEUE_DEPTH_THRESHOLD)
+        return available_queues
 
-    weights = {}
-    for region, depth in available_queues.items():
-        # 避免所有队列深度都为 max_depth 的情况
-        weight = max(1, max_depth - depth + 1)
-        weights[region] = weight
+    states = {region: circuit_breakers.state(region) for region in available_queues}
+    closed_queues = {
+        region: depth
+        for region, depth in available_queues.items()
+        if states[region] == STATE_CLOSED
+    }
+    if closed_queues:
+        return closed_queues
 
-    # 归一化权重
-    total_weight = sum(weights.values())
-    normalized_weights = {
-        region: weight / total_weight
-        for region, weight in weights.items()
+    half_open_queues = {
+        region: depth
+        for region, depth in available_queues.items()
+        if states[region] == STATE_HALF_OPEN
     }
+    if not half_open_queues:
+        logger.error("所有未过载队列的熔断器都已打开")
+    return half_open_queues
+
+
+def calculate_weights(queue_loads: Dict[str, int]) -> Dict[str, float]:
+    """
+    计算反向权重：负载越低，权重越高。
+
+    使用公式: weight = max(1, max_depth - current_depth + 1)
+    然后归一化权重，使总和为 1。
+
+    Args:
+        queue_loads: 队列 region 到消息数的映射
+
+    Returns:
+        Dict[str, float]: 队列 region 到归一化权重的映射
+    """
+    available_queues = get_available_queues(queue_loads)
+    if not available_queues:
+        return {}
+
+    normalized_weights = inverse_weights(available_queues)
 
-    logger.info(f"计算得到的归一化权重: {normalized_weights}")
+    logger.debug("计算得到的归一化权重: %s", normalized_weights)
     return normalized_weights
 
 
@@ -153,10 +702,81 @@ def select_target_queue(weights: Dict[str, float]) -> Tuple[str, str]:
     selected_region = random.choices(regions, weights=probabilities, k=1)[0]
     selected_queue_url = REGION_QUEUES[selected_region]
 
-    logger.debug(f"选择目标队列: {selected_region}")
+    logger.debug("选择目标队列: %s", selected_region)
     return selected_region, selected_queue_url
 
 
+def get_target_queue_urls(
+    count: int, exclude: Optional[Iterable[str]] = None
+) -> List[Tuple[str, str]]:
+    """
+    为一批消息获取目标队列 URL（负载每批只读取一次）。
+
+    使用 ROUTING_STRATEGY 配置的路由策略分配整批消息。熔断器打开的 Region
+    不参与分配；半开的 Region 获得探测名额时分到 CIRCUIT_PROBE_SHARE 比例
+    （至少 1 条）的消息，其余消息由路由策略在熔断器关闭的 Region 之间分配。
+
+    Args:
+        count: 消息数量
+        exclude: 不参与分配的 Region（如本次调用中转发失败的 Region）
+
+    Returns:
+        List[Tuple[str, str]]: 每条消息的 (region, queue_url)
+
+    Raises:
+        ValueError: 如果所有队列都已过载或被排除
+    """
+    if count <= 0:
+        return []
+
+    excluded = set(exclude or ())
+    effective_loads = get_effective_queue_loads()
+    available_queues = {
+        region: load
+        for region, load in get_available_queues(effective_loads).items()
+        if region not in excluded
+    }
+    if not available_queues:
+        if excluded:
+            raise ValueError("其余子队列都已过载或转发失败，无法分发消息")
+        raise ValueError("所有子队列都已过载，无法分发消息")
+
+    # 半开的 Region 分配少量探测流量
+    regions: List[str] = []
+    probe_count = max(1, int(count * CIRCUIT_PROBE_SHARE))
+    for region, load in effective_loads.items():
+        if len(regions) >= count:
+            break
+        if (
+            region in available_queues
+            or region in excluded
+            or load >= MAX_QUEUE_DEPTH_THRESHOLD
+            or circuit_breakers.state(region) != STATE_HALF_OPEN
+            or not circuit_breakers.try_acquire_probe(region)
+        ):
+            continue
+        probes = min(probe_count, count - len(regions))
+        logger.info("Region %s 熔断器半开，发送 %d 条探测消息", region, probes)
+        regions.extend([region] * probes)
+
+    remaining = count - len(regions)
+    if remaining > 0:
+        if ROUTING_COST == "drain_time":
+            regions.extend(
+                routing_strategy.assign(get_drain_costs(available_queues), remaining)
+            )
+        else:
+            regions.extend(routing_strategy.assign(available_queues, remaining))
+
+    routed: Dict[str, int] = {}
+    for region in regions:
+        routed[region] = routed.get(region, 0) + 1
+    for region, routed_count in routed.items():
+        record_routed(region, routed_count)
+
+    return [(region, REGION_QUEUES[region]) for region in regions]
+
+
 def get_target_queue_url() -> Tuple[str, str]:
     """
     获取目标队列 URL（完整流程）。
@@ -164,11 +784,4 @@ def get_target_queue_url() -> Tuple[str, str]:
     Returns:
         Tuple[str, str]: (region, queue_url)
     """
-    # 1. 获取队列负载
-    queue_loads = get_queue_loads()
-
-    # 2. 计算权重
-    weights = calculate_weights(queue_loads)
-
-    # 3. 选择目标队列
-    return select_target_queue(weights)
+    return get_target_queue_urls(1)[0]
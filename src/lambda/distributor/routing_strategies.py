@@ -0,0 +1,226 @@
+"""
+路由策略模块
+
+定义路由策略接口及内置实现，由 ROUTING_STRATEGY 环境变量选择：
+- inverse_weight: 反向权重 + 比例分配（默认）
+- least_loaded: 严格最小负载（逐条选择当前估算负载最小的 Region）
+- power_of_two: 随机抽取两个 Region，选择负载较低者
+- weighted_round_robin: 平滑加权轮询（nginx 算法），权重同 inverse_weight
+
+本模块不依赖 AWS SDK，可在本地基准测试中直接使用。
+"""
+import random
+from abc import ABC, abstractmethod
+from typing import Dict, List
+
+
+def inverse_weights(queue_loads: Dict[str, float]) -> Dict[str, float]:
+    """
+    计算归一化的反向权重：负载越低，权重越高。
+
+    使用公式: weight = max(1, max_depth - current_depth + 1)
+
+    Args:
+        queue_loads: 队列 region 到负载的映射（已过滤过载队列）
+
+    Returns:
+        Dict[str, float]: 队列 region 到归一化权重的映射
+    """
+    if not queue_loads:
+        return {}
+
+    max_depth = max(queue_loads.values())
+
+    # 避免所有队列深度都为 max_depth 的情况
+    weights = {
+        region: max(1, max_depth - depth + 1)
+        for region, depth in queue_loads.items()
+    }
+
+    total_weight = sum(weights.values())
+    return {
+        region: weight / total_weight
+        for region, weight in weights.items()
+    }
+
+
+def apportion(weights: Dict[str, float], count: int) -> List[str]:
+    """
+    按权重为 count 条消息分配 Region。
+
+    使用随机化的比例分配（系统抽样）：每个 Region 先分到 floor(weight * count)
+    条，剩余名额按小数部分以系统抽样分配，每个 Region 被多分配一条的概率恰好
+    等于其小数部分。这样整批消息的分配比例与权重一致（偏差小于 1 条），
+    期望值与逐条加权随机选择相同，最后打乱顺序避免消息按 Region 聚集。
+
+    Args:
+        weights: 队列 region 到归一化权重的映射（非空）
+        count: 消息数量
+
+    Returns:
+        List[str]: 每条消息的目标 Region
+    """
+    assigned: List[str] = []
+    remainders = []
+    for region, weight in weights.items():
+        quota = weight * count
+        seats = int(quota)
+        assigned.extend([region] * seats)
+        remainders.append((region, quota - seats))
+
+    # 系统抽样分配剩余名额
+    offset = random.random()
+    cumulative = 0.0
+    for region, remainder in remainders:
+        cumulative += remainder
+        if offset < cumulative and len(assigned) < count:
+            assigned.append(region)
+            offset += 1.0
+
+    # 浮点误差导致名额不足时，补给权重最大的 Region
+    if len(assigned) < count:
+        heaviest_region = max(weights, key=weights.get)
+        assigned.extend([heaviest_region] * (count - len(assigned)))
+
+    random.shuffle(assigned)
+    return assigned
+
+
+class RoutingStrategy(ABC):
+    """路由策略基类"""
+
+    name = ""
+
+    @abstractmethod
+    def assign(self, queue_loads: Dict[str, float], count: int) -> List[str]:
+        """
+        为一批消息分配目标 Region。
+
+        Args:
+            queue_loads: 可用队列 region 到估算负载的映射（非空，已过滤过载队列）
+            count: 消息数量
+
+        Returns:
+            List[str]: 每条消息的目标 Region
+        """
+
+
+class InverseWeightStrategy(RoutingStrategy):
+    """反向权重策略：按反向权重比例分配整批消息"""
+
+    name = "inverse_weight"
+
+    def assign(self, queue_loads: Dict[str, float], count: int) -> List[str]:
+        return apportion(inverse_weights(queue_loads), count)
+
+
+class LeastLoadedStrategy(RoutingStrategy):
+    """
+    严格最小负载策略
+
+    逐条选择当前估算负载最小的 Region，每分配一条消息将其估算负载加 1，
+    因此同一批次内的消息会逐步填平各 Region 的差距，而不是全部压到同一个 Region。
+    """
+
+    name = "least_loaded"
+
+    def assign(self, queue_loads: Dict[str, float], count: int) -> List[str]:
+        loads = dict(queue_loads)
+        assigned = []
+        for _ in range(count):
+            min_load = min(loads.values())
+            candidates = [region for region, load in loads.items() if load == min_load]
+            region = random.choice(candidates)
+            assigned.append(region)
+            loads[region] += 1
+        return assigned
+
+
+class PowerOfTwoChoicesStrategy(RoutingStrategy):
+    """
+    二选一策略（power-of-two-choices）
+
+    每条消息随机抽取两个 Region，选择估算负载较低者，并将其估算负载加 1。
+    相比严格最小负载，对陈旧的深度数据更不敏感，不易产生羊群效应。
+    """
+
+    name = "power_of_two"
+
+    def assign(self, queue_loads: Dict[str, float], count: int) -> List[str]:
+        loads = dict(queue_loads)
+        regions = list(loads.keys())
+        if len(regions) == 1:
+            return regions * count
+
+        assigned = []
+        for _ in range(count):
+            first, second = random.sample(regions, 2)
+            region = first if loads[first] <= loads[second] else second
+            assigned.append(region)
+            loads[region] += 1
+        return assigned
+
+
+class SmoothWeightedRoundRobinStrategy(RoutingStrategy):
+    """
+    平滑加权轮询策略（nginx smooth weighted round-robin）
+
+    权重与 inverse_weight 相同；每次选择时所有 Region 的当前值加上各自权重，
+    选出当前值最大的 Region 后减去总权重。当前值在 Lambda 容器复用时保持，
+    跨批次也能保证分配序列平滑、比例准确且不含随机性。
+    """
+
+    name = "weighted_round_robin"
+
+    def __init__(self):
+        self.current_weights: Dict[str, float] = {}
+
+    def assign(self, queue_loads: Dict[str, float], count: int) -> List[str]:
+        weights = inverse_weights(queue_loads)
+        total_weight = sum(weights.values())
+
+        # 不再可用的 Region 不保留当前值
+        self.current_weights = {
+            region: self.current_weights.get(region, 0.0) for region in weights
+        }
+
+        assigned = []
+        for _ in range(count):
+            for region, weight in weights.items():
+                self.current_weights[region] += weight
+            region = max(self.current_weights, key=self.current_weights.get)
+            self.current_weights[region] -= total_weight
+            assigned.append(region)
+        return assigned
+
+
+# 策略名到实现类的映射
+STRATEGIES = {
+    strategy.name: strategy
+    for strategy in (
+        InverseWeightStrategy,
+        LeastLoadedStrategy,
+        PowerOfTwoChoicesStrategy,
+        SmoothWeightedRoundRobinStrategy,
+    )
+}
+
+
+def create_strategy(name: str) -> RoutingStrategy:
+    """
+    根据名称创建路由策略。
+
+    Args:
+        name: 策略名称
+
+    Returns:
+        RoutingStrategy: 策略实例
+
+    Raises:
+        ValueError: 如果策略名称未知
+    """
+    if name not in STRATEGIES:
+        raise ValueError(
+            f"未知的路由策略: {name}，可选值: {', '.join(STRATEGIES)}"
+        )
+    return STRATEGIES[name]()
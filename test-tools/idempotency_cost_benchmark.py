@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+幂等性记录成本基准测试工具
+
+按 DynamoDB 的条目大小计算规则，比较 legacy 和 compact 两种记录格式
+（IDEMPOTENCY_RECORD_FORMAT）的条目大小、每百万条消息的 WCU 消耗和存储量，
+并与两阶段认领之前的基线（每条消息一次条件 PutItem）对比。无需 AWS 环境。
+
+计费模型：
+- 基线：每条消息一次条件 PutItem，写入 request_id、message_body_hash、
+  processed_at、ttl，不写 status 和租约
+- 每条消息写入两次：认领（IN_PROGRESS）和标记完成（COMPLETED）
+- 每 1 KB 消耗 1 WCU（不足 1 KB 按 1 KB 计）
+- 认领通过条件 PutItem 写入，标记完成通过 BatchWriteItem 写入
+- 存储按已完成记录计算，每个条目另加 100 字节索引开销
+"""
+import argparse
+import hashlib
+import math
+import os
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Dict, Optional
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "lambda", "distributor"),
+)
+
+from idempotency_records import (  # noqa: E402
+    build_record,
+    RECORD_FORMATS,
+    STATUS_COMPLETED,
+    STATUS_IN_PROGRESS,
+)
+
+# DynamoDB 每个条目的索引存储开销（字节）
+ITEM_STORAGE_OVERHEAD = 100
+
+
+def attribute_value_size(value: Any) -> int:
+    """按 DynamoDB 规则计算单个属性值的大小（字节）"""
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (int, float, Decimal)):
+        # 数字按有效数字计算：每 2 位有效数字 1 字节，另加 1 字节
+        digits = str(abs(Decimal(value))).replace(".", "").strip("0") or "0"
+        return (len(digits) + 1) // 2 + 1
+    return len(str(value).encode("utf-8"))
+
+
+def item_size(item: Dict[str, Any]) -> int:
+    """计算条目大小：属性名长度 + 属性值大小之和"""
+    return sum(
+        len(name.encode("utf-8")) + attribute_value_size(value)
+        for name, value in item.items()
+    )
+
+
+def sample_fingerprint(body_hash: str) -> Optional[str]:
+    """生成与 body_fingerprint 格式相同的示例指纹"""
+    body = b'{"request_id": "sample", "prompt": "hello"}'
+    if body_hash == "none":
+        return None
+    if body_hash == "crc32":
+        return f"crc32:{zlib.crc32(body):08x}"
+    return hashlib.sha256(body).hexdigest()
+
+
+def measure_baseline(request_id_length: int, body_hash: str) -> Dict[str, float]:
+    """
+    计算基线（每条消息一次条件 PutItem，无两阶段认领）的条目大小和成本
+
+    Returns:
+        Dict: 条目大小、每百万条消息的 WCU 和存储量
+    """
+    request_id = (uuid.uuid4().hex * (request_id_length // 32 + 1))[:request_id_length]
+    fingerprint = sample_fingerprint(body_hash)
+    now = time.time()
+
+    record = {
+        "request_id": request_id,
+        "processed_at": datetime.fromtimestamp(now, timezone.utc)
+        .replace(tzinfo=None)
+        .isoformat(),
+        "ttl": int(now) + 7 * 24 * 3600,
+    }
+    if fingerprint is not None:
+        record["message_body_hash"] = fingerprint
+
+    size = item_size(record)
+    return {
+        "claim_size": size,
+        "completed_size": size,
+        "wcu_per_million": math.ceil(size / 1024) * 1_000_000,
+        "storage_mb_per_million": (size + ITEM_STORAGE_OVERHEAD) * 1_000_000 / 1024 / 1024,
+    }
+
+
+def measure(record_format: str, request_id_length: int, body_hash: str) -> Dict[str, float]:
+    """
+    计算一种记录格式的条目大小和成本
+
+    Returns:
+        Dict: 条目大小、每百万条消息的 WCU 和存储量
+    """
+    request_id = (uuid.uuid4().hex * (request_id_length // 32 + 1))[:request_id_length]
+    fingerprint = sample_fingerprint(body_hash)
+    now = time.time()
+
+    claim = build_record(
+        request_id, fingerprint, STATUS_IN_PROGRESS, now,
+        ttl_seconds=7 * 24 * 3600, lease_seconds=360, record_format=record_format,
+        claim_token=uuid.uuid4().hex,
+    )
+    completed = build_record(
+        request_id, fingerprint, STATUS_COMPLETED, now,
+        ttl_seconds=7 * 24 * 3600, lease_seconds=360, record_format=record_format,
+    )
+
+    claim_size = item_size(claim)
+    completed_size = item_size(completed)
+    claim_wcu = math.ceil(claim_size / 1024)
+    completed_wcu = math.ceil(completed_size / 1024)
+
+    return {
+        "claim_size": claim_size,
+        "completed_size": completed_size,
+        "wcu_per_million": (claim_wcu + completed_wcu) * 1_000_000,
+        "storage_mb_per_million": (
+            (completed_size + ITEM_STORAGE_OVERHEAD) * 1_000_000 / 1024 / 1024
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="幂等性记录成本基准测试 - 比较 legacy 和 compact 记录格式"
+    )
+
+    parser.add_argument(
+        "--request-id-length",
+        type=int,
+        default=36,
+        help="request_id 长度（默认: 36，即 UUID 字符串）"
+    )
+
+    parser.add_argument(
+        "--body-hash",
+        choices=["none", "crc32", "sha256"],
+        default="sha256",
+        help="消息体指纹算法（默认: sha256）"
+    )
+
+    args = parser.parse_args()
+
+    print(f"📊 request_id 长度: {args.request_id_length}，指纹算法: {args.body_hash}\n")
+
+    header = (
+        f"{'格式':<10}{'认领记录(B)':>14}{'完成记录(B)':>14}"
+        f"{'WCU/百万条':>14}{'存储(MB)/百万条':>18}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    baseline = measure_baseline(args.request_id_length, args.body_hash)
+    print(
+        f"{'baseline':<10}{baseline['claim_size']:>14}{baseline['completed_size']:>14}"
+        f"{baseline['wcu_per_million']:>14,.0f}{baseline['storage_mb_per_million']:>18.1f}"
+    )
+
+    results = {}
+    for record_format in RECORD_FORMATS:
+        result = measure(record_format, args.request_id_length, args.body_hash)
+        results[record_format] = result
+        print(
+            f"{record_format:<10}{result['claim_size']:>14}{result['completed_size']:>14}"
+            f"{result['wcu_per_million']:>14,.0f}{result['storage_mb_per_million']:>18.1f}"
+        )
+
+    legacy, compact = results["legacy"], results["compact"]
+    print(
+        f"\ncompact 完成记录缩小 "
+        f"{1 - compact['completed_size'] / legacy['completed_size']:.0%}，"
+        f"存储减少 "
+        f"{1 - compact['storage_mb_per_million'] / legacy['storage_mb_per_million']:.0%}，"
+        f"WCU 减少 {1 - compact['wcu_per_million'] / legacy['wcu_per_million']:.0%}"
+    )
+    print("（WCU 按 1 KB 向上取整，条目小于 1 KB 时两种格式的 WCU 相同）")
+    print(
+        f"\n⚠️  相对基线（每条消息 1 次 PutItem），两阶段认领使每条消息的 WCU 从 "
+        f"{baseline['wcu_per_million'] / 1_000_000:.0f} 增至 "
+        f"{compact['wcu_per_million'] / 1_000_000:.0f}"
+        f"（{compact['wcu_per_million'] / baseline['wcu_per_million']:.1f} 倍）："
+        "认领一次条件写入，另加一次完成写入"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+"""
+路由策略基准测试工具
+
+在本地模拟多个 Lambda 容器向多个 Region 子队列分发消息，比较各路由策略的
+队列深度方差、排空吞吐量以及路由计算本身的吞吐量。无需 AWS 环境。
+
+模拟模型：
+- 每个 Region 以固定速率消费消息（drain rate）
+- 消息以固定速率到达，每 10 条组成一个批次，随机交给一个容器处理
+- 每个容器独立缓存队列深度（每 CACHE_TTL 秒刷新一次），并叠加自上次刷新
+  以来自己路由的消息数，与 queue_selector 的行为一致
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "lambda", "distributor"),
+)
+
+from routing_strategies import STRATEGIES, create_strategy  # noqa: E402
+
+
+class SimulatedContainer:
+    """模拟的 Lambda 容器：持有自己的负载缓存、路由计数和策略实例"""
+
+    def __init__(self, strategy_name: str, cache_ttl: float):
+        self.strategy = create_strategy(strategy_name)
+        self.cache_ttl = cache_ttl
+        self.cache: Dict[str, float] = {}
+        self.cache_timestamp = -float("inf")
+        self.routed: Dict[str, int] = {}
+
+    def route(
+        self, now: float, depths: Dict[str, float], count: int, threshold: int
+    ) -> List[str]:
+        """为一批消息选择目标 Region"""
+        if now - self.cache_timestamp >= self.cache_ttl:
+            self.cache = dict(depths)
+            self.cache_timestamp = now
+            self.routed = {}
+
+        loads = {
+            region: depth + self.routed.get(region, 0)
+            for region, depth in self.cache.items()
+        }
+        available = {region: load for region, load in loads.items() if load < threshold}
+        if not available:
+            return []
+
+        regions = self.strategy.assign(available, count)
+        for region in regions:
+            self.routed[region] = self.routed.get(region, 0) + 1
+        return regions
+
+
+def simulate(
+    strategy_name: str,
+    drain_rates: Dict[str, float],
+    arrival_rate: float,
+    duration: float,
+    containers: int,
+    cache_ttl: float,
+    threshold: int,
+    seed: int,
+) -> Dict[str, float]:
+    """
+    运行一次模拟
+
+    Returns:
+        Dict: 模拟结果指标
+    """
+    random.seed(seed)
+    tick = 0.1
+    batch_size = 10
+
+    depths = {region: 0.0 for region in drain_rates}
+    pool = [SimulatedContainer(strategy_name, cache_ttl) for _ in range(containers)]
+
+    pending_arrivals = 0.0
+    drained = 0.0
+    rejected = 0
+    variance_sum = 0.0
+    max_depth = 0.0
+    route_time = 0.0
+    routed_total = 0
+    samples = 0
+
+    now = 0.0
+    while now < duration:
+        # 消息到达并分批路由
+        pending_arrivals += arrival_rate * tick
+        while pending_arrivals >= batch_size:
+            pending_arrivals -= batch_size
+            container = random.choice(pool)
+
+            start = time.perf_counter()
+            regions = container.route(now, depths, batch_size, threshold)
+            route_time += time.perf_counter() - start
+
+            if not regions:
+                rejected += batch_size
+                continue
+            routed_total += len(regions)
+            for region in regions:
+                depths[region] += 1
+
+        # 各 Region 消费消息
+        for region, rate in drain_rates.items():
+            consumed = min(depths[region], rate * tick)
+            depths[region] -= consumed
+            drained += consumed
+
+        values = list(depths.values())
+        mean = sum(values) / len(values)
+        variance_sum += sum((value - mean) ** 2 for value in values) / len(values)
+        max_depth = max(max_depth, max(values))
+        samples += 1
+        now += tick
+
+    return {
+        "depth_variance": variance_sum / samples,
+        "max_depth": max_depth,
+        "final_backlog": sum(depths.values()),
+        "drain_throughput": drained / duration,
+        "rejected": rejected,
+        "routing_ops_per_sec": routed_total / route_time if route_time > 0 else 0.0,
+    }
+
+
+def parse_drain_rates(value: str) -> Dict[str, float]:
+    """解析形如 us-east-1=40,us-west-2=25 的消费速率配置"""
+    rates = {}
+    for item in value.split(","):
+        region, rate = item.split("=")
+        rates[region.strip()] = float(rate)
+    return rates
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="路由策略基准测试 - 在模拟负载下比较各路由策略"
+    )
+
+    parser.add_argument(
+        "--drain-rates",
+        default="us-east-1=40,us-west-2=25,us-west-1=10",
+        help="各 Region 消费速率（条/秒），默认: us-east-1=40,us-west-2=25,us-west-1=10"
+    )
+
+    parser.add_argument(
+        "--arrival-rate",
+        type=float,
+        default=70.0,
+        help="消息到达速率（条/秒，默认: 70）"
+    )
+
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=600.0,
+        help="模拟时长（秒，默认: 600）"
+    )
+
+    parser.add_argument(
+        "--containers",
+        type=int,
+        default=10,
+        help="并发 Lambda 容器数（默认: 10）"
+    )
+
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=10.0,
+        help="队列负载缓存时间（秒，默认: 10）"
+    )
+
+    parser.add_argument(
+        "--threshold",
+        type=int,
+        default=5000,
+        help="队列过载阈值（默认: 5000）"
+    )
+
+    parser.add_argument(
+        "--strategies",
+        default=",".join(STRATEGIES),
+        help=f"要比较的策略，逗号分隔（默认: {','.join(STRATEGIES)}）"
+    )
+
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=42,
+        help="随机种子（默认: 42）"
+    )
+
+    args = parser.parse_args()
+    drain_rates = parse_drain_rates(args.drain_rates)
+
+    print(f"📊 消费速率: {drain_rates}，到达速率: {args.arrival_rate} 条/秒")
+    print(
+        f"模拟时长: {args.duration}s，容器数: {args.containers}，"
+        f"缓存时间: {args.cache_ttl}s\n"
+    )
+
+    header = (
+        f"{'策略':<22}{'深度方差':>12}{'最大深度':>10}{'剩余积压':>10}"
+        f"{'排空吞吐(条/s)':>16}{'拒绝':>8}{'路由吞吐(条/s)':>16}"
+    )
+    print(header)
+    print("-" * len(header))
+
+    for strategy_name in args.strategies.split(","):
+        result = simulate(
+            strategy_name.strip(),
+            drain_rates,
+            args.arrival_rate,
+            args.duration,
+            args.containers,
+            args.cache_ttl,
+            args.threshold,
+            args.seed,
+        )
+        print(
+            f"{strategy_name:<22}{result['depth_variance']:>12.1f}"
+            f"{result['max_depth']:>10.0f}{result['final_backlog']:>10.0f}"
+            f"{result['drain_throughput']:>16.1f}{result['rejected']:>8}"
+            f"{result['routing_ops_per_sec']:>16.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
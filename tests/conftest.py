@@ -0,0 +1,53 @@
+"""
+单元测试公共配置
+
+在导入被测模块之前设置环境变量（各模块在导入时读取配置并创建 AWS 客户端），
+并提供 moto 模拟的 DynamoDB 表和各模块全局状态的重置。
+"""
+import json
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+os.environ["REGION_QUEUES"] = json.dumps({
+    "us-east-1": "https://sqs.us-east-1.amazonaws.com/123456789012/inference-us-east-1",
+    "us-west-2": "https://sqs.us-west-2.amazonaws.com/123456789012/inference-us-west-2",
+    "eu-west-1": "https://sqs.eu-west-1.amazonaws.com/123456789012/inference-eu-west-1",
+})
+os.environ["IDEMPOTENCY_TABLE_NAME"] = "test-idempotency"
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "lambda", "distributor"),
+)
+
+from moto import mock_aws  # noqa: E402
+
+
+@pytest.fixture
+def aws():
+    """启用 moto 模拟的 AWS 环境"""
+    with mock_aws():
+        yield
+
+
+@pytest.fixture
+def idempotency_table(aws, monkeypatch):
+    """创建模拟的幂等性表，并清空幂等性模块的表缓存和本地缓存"""
+    import boto3
+    import idempotency
+
+    boto3.client("dynamodb").create_table(
+        TableName=os.environ["IDEMPOTENCY_TABLE_NAME"],
+        KeySchema=[{"AttributeName": "request_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "request_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    monkeypatch.setattr(idempotency, "idempotency_table", None)
+    monkeypatch.setattr(idempotency, "_recent_claims", idempotency.OrderedDict())
+    idempotency.new_claim_token()
+    return idempotency.get_idempotency_table()
@@ -0,0 +1,133 @@
+"""Region 熔断器状态转换的测试"""
+from circuit_breaker import (
+    SIGNAL_ATTRIBUTES,
+    STATE_CLOSED,
+    STATE_HALF_OPEN,
+    STATE_OPEN,
+    RegionCircuitBreakers,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breakers():
+    clock = FakeClock()
+    return RegionCircuitBreakers(failure_threshold=3, reset_timeout=30, clock=clock), clock
+
+
+def test_opens_after_consecutive_failures():
+    breakers, _ = make_breakers()
+
+    assert not breakers.record_failure("us-east-1")
+    assert not breakers.record_failure("us-east-1")
+    assert breakers.record_failure("us-east-1")
+    assert breakers.state("us-east-1") == STATE_OPEN
+    assert breakers.state("us-west-2") == STATE_CLOSED
+
+
+def test_success_resets_failure_count_while_closed():
+    breakers, _ = make_breakers()
+
+    breakers.record_failure("us-east-1")
+    breakers.record_failure("us-east-1")
+    breakers.record_success("us-east-1")
+    breakers.record_failure("us-east-1")
+    assert breakers.state("us-east-1") == STATE_CLOSED
+
+
+def test_half_open_allows_a_single_probe():
+    breakers, clock = make_breakers()
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+
+    assert not breakers.try_acquire_probe("us-east-1")
+    clock.now += 30
+    assert breakers.state("us-east-1") == STATE_HALF_OPEN
+    assert breakers.try_acquire_probe("us-east-1")
+    assert not breakers.try_acquire_probe("us-east-1")
+
+
+def test_stalled_probe_is_released_after_reset_timeout():
+    breakers, clock = make_breakers()
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+    clock.now += 30
+    assert breakers.try_acquire_probe("us-east-1")
+
+    clock.now += 30
+    assert breakers.try_acquire_probe("us-east-1")
+
+
+def test_probe_success_closes():
+    breakers, clock = make_breakers()
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+    clock.now += 30
+    breakers.try_acquire_probe("us-east-1")
+
+    breakers.record_success("us-east-1")
+    assert breakers.state("us-east-1") == STATE_CLOSED
+
+
+def test_probe_failure_reopens():
+    breakers, clock = make_breakers()
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+    clock.now += 30
+    breakers.try_acquire_probe("us-east-1")
+
+    assert breakers.record_failure("us-east-1")
+    assert breakers.state("us-east-1") == STATE_OPEN
+
+
+def test_attribute_successes_do_not_mask_send_failures():
+    breakers, _ = make_breakers()
+
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+        breakers.record_success("us-east-1", SIGNAL_ATTRIBUTES)
+    assert breakers.state("us-east-1") == STATE_OPEN
+
+
+def test_attribute_failures_open_independently():
+    breakers, _ = make_breakers()
+
+    breakers.record_failure("us-east-1", SIGNAL_ATTRIBUTES)
+    breakers.record_failure("us-east-1", SIGNAL_ATTRIBUTES)
+    breakers.record_success("us-east-1", SIGNAL_ATTRIBUTES)
+    breakers.record_failure("us-east-1", SIGNAL_ATTRIBUTES)
+    assert breakers.state("us-east-1") == STATE_CLOSED
+
+    breakers.record_failure("us-east-1", SIGNAL_ATTRIBUTES)
+    assert breakers.record_failure("us-east-1", SIGNAL_ATTRIBUTES)
+
+
+def test_attribute_success_does_not_close_an_open_breaker():
+    breakers, clock = make_breakers()
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+
+    breakers.record_success("us-east-1", SIGNAL_ATTRIBUTES)
+    assert breakers.state("us-east-1") == STATE_OPEN
+
+    clock.now += 30
+    breakers.record_success("us-east-1", SIGNAL_ATTRIBUTES)
+    assert breakers.state("us-east-1") == STATE_HALF_OPEN
+
+
+def test_attribute_failure_does_not_cancel_a_probe():
+    breakers, clock = make_breakers()
+    for _ in range(3):
+        breakers.record_failure("us-east-1")
+    clock.now += 30
+    assert breakers.try_acquire_probe("us-east-1")
+
+    breakers.record_failure("us-east-1", SIGNAL_ATTRIBUTES)
+    assert breakers.state("us-east-1") == STATE_HALF_OPEN
+    assert not breakers.try_acquire_probe("us-east-1")
@@ -0,0 +1,38 @@
+"""配置校验的测试"""
+import pytest
+
+from config import Config
+
+
+def test_default_configuration_is_valid():
+    Config().validate()
+
+
+def test_invalid_log_level_is_rejected(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "verbose")
+    with pytest.raises(ValueError, match="LOG_LEVEL"):
+        Config().validate()
+
+
+def test_invocation_time_reserve_is_computed_unless_configured(monkeypatch):
+    monkeypatch.delenv("INVOCATION_TIME_RESERVE", raising=False)
+    assert Config().invocation_time_reserve is None
+
+    monkeypatch.setenv("INVOCATION_TIME_RESERVE", "12")
+    assert Config().invocation_time_reserve == 12.0
+
+
+def test_sqs_max_attempts_must_be_positive(monkeypatch):
+    monkeypatch.setenv("SQS_MAX_ATTEMPTS", "0")
+    with pytest.raises(ValueError, match="SQS_MAX_ATTEMPTS"):
+        Config().validate()
+
+
+def test_drain_time_requires_the_shared_snapshot(monkeypatch):
+    monkeypatch.setenv("ROUTING_COST", "drain_time")
+    monkeypatch.delenv("LOAD_SNAPSHOT_TABLE_NAME", raising=False)
+    with pytest.raises(ValueError, match="LOAD_SNAPSHOT_TABLE_NAME"):
+        Config().validate()
+
+    monkeypatch.setenv("LOAD_SNAPSHOT_TABLE_NAME", "load-snapshots")
+    Config().validate()
@@ -0,0 +1,347 @@
+"""批次内去重、SendMessageBatch 打包与重试、转发故障转移、按剩余时间推迟和调用摘要的测试"""
+import json
+import time
+
+import boto3
+import pytest
+from botocore.exceptions import EndpointConnectionError
+
+import handler
+import queue_selector
+from handler import (
+    PipelineTimer,
+    collapse_duplicates,
+    forward_messages_batch,
+    lambda_handler,
+    pack_batches,
+    send_batch,
+)
+from idempotency import get_processed_record
+from metrics import take_invocation_metrics
+
+
+def message(request_id, body="x", fingerprint="f"):
+    return {"request_id": request_id, "message_body": body, "fingerprint": fingerprint}
+
+
+def test_collapse_duplicates_keeps_first_occurrence():
+    first = message("a")
+    copy = message("a")
+    conflict = message("a", fingerprint="g")
+    other = message("b")
+
+    unique, duplicates, conflicts = collapse_duplicates([first, other, copy, conflict])
+
+    assert unique == [first, other]
+    assert unique[0] is first
+    assert duplicates == [copy]
+    assert conflicts == [conflict]
+
+
+def test_pack_batches_respects_entry_limit():
+    batches = pack_batches([message(str(i)) for i in range(25)], max_entries=10)
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+
+def test_pack_batches_first_fit_by_bytes():
+    sizes = [60, 60, 30, 40]
+    messages = [message(str(i), body="x" * size) for i, size in enumerate(sizes)]
+
+    batches = pack_batches(messages, max_entries=10, max_bytes=100)
+
+    assert [[m["request_id"] for m in batch] for batch in batches] == [["0", "2"], ["1", "3"]]
+
+
+def test_pack_batches_counts_utf8_bytes():
+    batches = pack_batches([message("a", body="字" * 20), message("b", body="字" * 20)],
+                           max_entries=10, max_bytes=100)
+    assert len(batches) == 2
+
+
+def test_pack_batches_isolates_oversized_message():
+    messages = [message("big", body="x" * 150), message("a"), message("b")]
+
+    batches = pack_batches(messages, max_entries=10, max_bytes=100)
+
+    assert [[m["request_id"] for m in batch] for batch in batches] == [["big"], ["a", "b"]]
+
+
+@pytest.fixture
+def region_queues(aws, idempotency_table, monkeypatch):
+    """创建各 Region 的子队列，并清空队列负载缓存和熔断器状态"""
+    for region, queue_url in queue_selector.REGION_QUEUES.items():
+        boto3.client("sqs", region_name=region).create_queue(
+            QueueName=queue_url.rsplit("/", 1)[-1]
+        )
+    monkeypatch.setattr(queue_selector, "queue_load_cache", {})
+    monkeypatch.setattr(queue_selector, "cache_timestamp", 0.0)
+    monkeypatch.setattr(queue_selector, "routed_since_refresh", {})
+    monkeypatch.setattr(
+        queue_selector, "circuit_breakers", queue_selector.RegionCircuitBreakers(3, 30)
+    )
+    take_invocation_metrics()
+
+
+def test_invocation_writes_a_single_emf_line(region_queues, capsys):
+    event = {"Records": [
+        {"messageId": "m1", "receiptHandle": "r1", "body": "not json"},
+        {"messageId": "m2", "receiptHandle": "r2", "body": json.dumps({"request_id": "a"})},
+        {"messageId": "m3", "receiptHandle": "r3", "body": json.dumps({"request_id": "b"})},
+    ]}
+
+    result = lambda_handler(event, None)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1
+    document = json.loads(lines[0])
+    assert document["message"] == "invocation_summary"
+    assert document["success"] == 2 and document["failed"] == 1
+    assert "ParseDuration" in document and "idempotency_cache" in document
+    # 路由时的队列负载刷新指标写入同一条日志
+    assert document["QueueLoadRefreshes"] == 1
+    names = {metric["Name"] for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    assert {"QueueLoadRefreshDuration", "ForwardDuration"} <= names
+    assert result["batchItemFailures"] == [{"itemIdentifier": "m1"}]
+
+
+def test_circuit_opened_is_reported_in_the_summary(capsys, monkeypatch):
+    monkeypatch.setattr(
+        queue_selector, "circuit_breakers", queue_selector.RegionCircuitBreakers(3, 30)
+    )
+    take_invocation_metrics()
+    for _ in range(3):
+        queue_selector.record_region_failure("eu-west-1")
+
+    timer = PipelineTimer()
+    timer.emit({"message": "invocation_summary"})
+
+    document = json.loads(capsys.readouterr().out)
+    assert document["CircuitOpened"] == 1
+    assert document["circuit_opened"] == ["eu-west-1"]
+
+
+class FakeSQS:
+    """按顺序返回预设的 SendMessageBatch 响应，并记录每次调用的条目 Id"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self.calls.append([entry["Id"] for entry in Entries])
+        assert self.responses, "发送次数超过预期"
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def sent(*ids):
+    return [{"Id": msg_id} for msg_id in ids]
+
+
+def failed(*ids, sender_fault=False):
+    return [
+        {"Id": msg_id, "Code": "InternalError", "SenderFault": sender_fault}
+        for msg_id in ids
+    ]
+
+
+@pytest.fixture
+def fake_sqs(monkeypatch):
+    """替换 handler 的 SQS 客户端，重试不等待"""
+    monkeypatch.setattr(handler.time, "sleep", lambda seconds: None)
+
+    def install(*responses):
+        client = FakeSQS(*responses)
+        monkeypatch.setattr(handler, "sqs_client", client)
+        return client
+
+    return install
+
+
+def test_send_batch_retries_only_failed_entries(fake_sqs):
+    client = fake_sqs(
+        {"Successful": sent("0", "2"), "Failed": failed("1")},
+        {"Successful": sent("1")},
+    )
+
+    result = send_batch("queue", [message("a"), message("b"), message("c")])
+
+    assert client.calls == [["0", "1", "2"], ["1"]]
+    assert result["success"] == 3 and result["failed"] == 0
+    assert [msg["request_id"] for msg in result["forwarded"]] == ["a", "c", "b"]
+
+
+def test_send_batch_does_not_retry_sender_faults(fake_sqs):
+    client = fake_sqs(
+        {"Successful": sent("0"), "Failed": failed("1", sender_fault=True)},
+    )
+
+    result = send_batch("queue", [message("a"), message("b")])
+
+    assert client.calls == [["0", "1"]]
+    assert result["success"] == 1 and result["failed"] == 1
+
+
+def test_send_batch_gives_up_after_max_retries(fake_sqs, monkeypatch):
+    monkeypatch.setattr(handler, "FORWARD_MAX_RETRIES", 2)
+    client = fake_sqs(*[{"Failed": failed("0")}] * 3)
+
+    result = send_batch("queue", [message("a")])
+
+    assert len(client.calls) == 3
+    assert result["success"] == 0 and result["failed"] == 1
+    assert result["unsent"] == []
+
+
+def test_send_batch_stops_retrying_at_the_deadline(fake_sqs):
+    client = fake_sqs({"Failed": failed("0")})
+
+    result = send_batch("queue", [message("a")], deadline=handler.time.monotonic())
+
+    assert len(client.calls) == 1
+    assert result["failed"] == 1
+
+
+class RegionFailingSQS:
+    """对指定队列的 SendMessageBatch 整个调用失败，发往其余队列的全部成功"""
+
+    def __init__(self, failing_urls):
+        self.failing_urls = set(failing_urls)
+
+    def send_message_batch(self, QueueUrl, Entries):
+        if QueueUrl in self.failing_urls:
+            raise EndpointConnectionError(endpoint_url=QueueUrl)
+        return {"Successful": [{"Id": entry["Id"]} for entry in Entries]}
+
+
+def routed_message(request_id, region):
+    return {
+        **message(request_id),
+        "target_region": region,
+        "target_queue_url": queue_selector.REGION_QUEUES[region],
+    }
+
+
+def test_forward_fails_over_to_the_remaining_regions(monkeypatch):
+    urls = queue_selector.REGION_QUEUES
+    monkeypatch.setattr(handler, "sqs_client", RegionFailingSQS([urls["us-east-1"]]))
+    monkeypatch.setattr(
+        queue_selector, "circuit_breakers", queue_selector.RegionCircuitBreakers(3, 30)
+    )
+    routed = []
+    monkeypatch.setattr(handler, "record_routed", lambda *args: routed.append(args))
+    exclusions = []
+
+    def get_target_queue_urls(count, exclude=None):
+        exclusions.append(set(exclude))
+        return [("us-west-2", urls["us-west-2"])] * count
+
+    monkeypatch.setattr(handler, "get_target_queue_urls", get_target_queue_urls)
+
+    result = forward_messages_batch([
+        routed_message("a", "us-east-1"),
+        routed_message("b", "us-east-1"),
+        routed_message("c", "eu-west-1"),
+    ])
+
+    assert result["success"] == 3 and result["failed"] == 0
+    assert {msg["request_id"]: msg["target_region"] for msg in result["forwarded"]} == {
+        "a": "us-west-2", "b": "us-west-2", "c": "eu-west-1",
+    }
+    assert exclusions == [{"us-east-1"}]
+    # 未发送的消息从失败 Region 的路由计数中扣除
+    assert routed == [("us-east-1", -2)]
+
+
+def test_all_regions_failing_releases_the_claims(region_queues, monkeypatch):
+    monkeypatch.setattr(
+        handler, "sqs_client", RegionFailingSQS(queue_selector.REGION_QUEUES.values())
+    )
+    event = {"Records": [
+        {"messageId": f"m{i}", "receiptHandle": f"r{i}",
+         "body": json.dumps({"request_id": request_id})}
+        for i, request_id in enumerate(["a", "b", "c"])
+    ]}
+
+    result = lambda_handler(event, None)
+
+    assert json.loads(result["body"])["failed"] == 3
+    assert result["batchItemFailures"] == [
+        {"itemIdentifier": "m0"}, {"itemIdentifier": "m1"}, {"itemIdentifier": "m2"},
+    ]
+    # 认领已释放，重新投递时可以立即重新认领
+    assert all(get_processed_record(request_id) is None for request_id in "abc")
+
+
+class FakeContext:
+    """只提供剩余执行时间的 Lambda 上下文"""
+
+    def __init__(self, remaining_seconds):
+        self.remaining_seconds = remaining_seconds
+
+    def get_remaining_time_in_millis(self):
+        return int(self.remaining_seconds * 1000)
+
+
+def sqs_event(*request_ids):
+    return {"Records": [
+        {"messageId": f"m-{request_id}", "receiptHandle": f"r-{request_id}",
+         "body": json.dumps({"request_id": request_id})}
+        for request_id in request_ids
+    ]}
+
+
+def assert_all_deferred(result, *request_ids):
+    summary = json.loads(result["body"])
+    assert summary["deferred"] == summary["failed"] == len(request_ids)
+    assert result["batchItemFailures"] == [
+        {"itemIdentifier": f"m-{request_id}"} for request_id in request_ids
+    ]
+    # 推迟的消息不留下认领记录，重新投递时可以立即处理
+    assert all(get_processed_record(request_id) is None for request_id in request_ids)
+
+
+def test_claim_is_deferred_without_time_for_route_and_forward(region_queues, fake_sqs):
+    client = fake_sqs()
+    remaining = handler.INVOCATION_TIME_RESERVE + handler.CLAIM_FORWARD_BUDGET - 1
+
+    result = lambda_handler(sqs_event("a", "b"), FakeContext(remaining))
+
+    assert_all_deferred(result, "a", "b")
+    assert client.calls == []
+
+
+def test_route_is_deferred_and_claims_are_released(region_queues, fake_sqs, monkeypatch):
+    client = fake_sqs()
+    # 认领阶段不为路由和转发预留时间，认领完成时已过截止时间
+    monkeypatch.setattr(handler, "CLAIM_FORWARD_BUDGET", -1.0)
+
+    result = lambda_handler(
+        sqs_event("a", "b"), FakeContext(handler.INVOCATION_TIME_RESERVE)
+    )
+
+    assert_all_deferred(result, "a", "b")
+    assert client.calls == []
+
+
+def test_forward_is_deferred_and_claims_are_released(region_queues, monkeypatch):
+    client = FakeSQS()
+    monkeypatch.setattr(handler, "sqs_client", client)
+    monkeypatch.setattr(handler, "CLAIM_FORWARD_BUDGET", -1.0)
+    route_messages = handler.route_messages
+
+    def slow_route(messages, stats):
+        routed = route_messages(messages, stats)
+        time.sleep(0.3)
+        return routed
+
+    monkeypatch.setattr(handler, "route_messages", slow_route)
+
+    result = lambda_handler(
+        sqs_event("a", "b"), FakeContext(handler.INVOCATION_TIME_RESERVE + 0.2)
+    )
+
+    assert_all_deferred(result, "a", "b")
+    assert client.calls == []
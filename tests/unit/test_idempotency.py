@@ -0,0 +1,196 @@
+"""幂等性认领状态机（认领、租约、完成、释放）的测试"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+import idempotency
+from idempotency import (
+    CLAIM_CONFLICT,
+    CLAIM_DUPLICATE,
+    CLAIM_ERROR,
+    CLAIM_FIRST_TIME,
+    CLAIM_IN_PROGRESS,
+    body_fingerprint,
+    check_and_record_messages,
+    claim_message,
+    get_processed_record,
+    mark_messages_completed,
+    new_claim_token,
+    release_message_claims,
+)
+from idempotency_records import RECORD_FORMATS
+
+
+@pytest.fixture(params=RECORD_FORMATS, autouse=True)
+def record_format(request, idempotency_table, monkeypatch):
+    """两种记录格式的认领语义相同"""
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_RECORD_FORMAT", request.param)
+    return request.param
+
+
+def batch(*request_ids, body="payload"):
+    return [(request_id, body_fingerprint(body)) for request_id in request_ids]
+
+
+def test_first_claim_records_in_progress_lease():
+    assert check_and_record_messages(batch("a", "b")) == [CLAIM_FIRST_TIME] * 2
+
+    record = get_processed_record("a")
+    assert record["status"] == "IN_PROGRESS"
+    assert "lease_until" in record
+
+
+def test_batch_claims_run_concurrently_on_the_executor():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert check_and_record_messages(
+            batch("a", "b", "c"), executor=executor
+        ) == [CLAIM_FIRST_TIME] * 3
+
+        new_claim_token()
+        assert check_and_record_messages(
+            batch("a", "b", "d"), executor=executor
+        ) == [CLAIM_IN_PROGRESS, CLAIM_IN_PROGRESS, CLAIM_FIRST_TIME]
+
+
+def test_transport_error_fails_only_its_own_record(monkeypatch):
+    client = idempotency.dynamodb.meta.client
+    put_item = client.put_item
+
+    def flaky_put_item(**kwargs):
+        if kwargs["Item"].get("request_id") == "b":
+            raise ReadTimeoutError(endpoint_url="https://dynamodb")
+        return put_item(**kwargs)
+
+    monkeypatch.setattr(client, "put_item", flaky_put_item)
+    assert check_and_record_messages(batch("a", "b", "c")) == [
+        CLAIM_FIRST_TIME, CLAIM_ERROR, CLAIM_FIRST_TIME,
+    ]
+
+
+def test_claim_held_by_another_invocation_is_in_progress():
+    check_and_record_messages(batch("a", "b"))
+
+    new_claim_token()
+    assert check_and_record_messages(batch("a", "b")) == [CLAIM_IN_PROGRESS] * 2
+    assert claim_message("a", "payload") == CLAIM_IN_PROGRESS
+
+
+def test_retried_claim_of_own_record_is_first_time():
+    """SDK 重试一个实际已成功的认领时，看到的是本次调用自己的记录"""
+    check_and_record_messages(batch("a", "b"))
+
+    assert check_and_record_messages(batch("a", "b")) == [CLAIM_FIRST_TIME] * 2
+    assert claim_message("a", "payload") == CLAIM_FIRST_TIME
+
+
+def test_expired_lease_can_be_reclaimed(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_LEASE_SECONDS", -10)
+    check_and_record_messages(batch("a", "b"))
+
+    new_claim_token()
+    assert check_and_record_messages(batch("a", "b")) == [CLAIM_FIRST_TIME] * 2
+
+
+def test_completed_message_is_duplicate():
+    messages = batch("a", "b")
+    check_and_record_messages(messages)
+    mark_messages_completed(messages)
+
+    assert get_processed_record("a")["status"] == "COMPLETED"
+    new_claim_token()
+    assert check_and_record_messages(messages) == [CLAIM_DUPLICATE] * 2
+
+
+def test_completed_message_is_duplicate_without_local_cache(monkeypatch):
+    messages = batch("a", "b")
+    check_and_record_messages(messages)
+    mark_messages_completed(messages)
+
+    monkeypatch.setattr(idempotency, "_recent_claims", idempotency.OrderedDict())
+    new_claim_token()
+    assert check_and_record_messages(messages) == [CLAIM_DUPLICATE] * 2
+    assert claim_message("a", "payload") == CLAIM_DUPLICATE
+
+
+def test_released_claim_can_be_reclaimed():
+    check_and_record_messages(batch("a", "b"))
+    release_message_claims(["a"])
+
+    assert get_processed_record("a") is None
+    new_claim_token()
+    assert check_and_record_messages(batch("a", "b")) == [
+        CLAIM_FIRST_TIME, CLAIM_IN_PROGRESS,
+    ]
+
+
+def test_different_body_with_same_request_id_conflicts():
+    messages = batch("a", "b")
+    check_and_record_messages(messages)
+    mark_messages_completed(messages)
+
+    new_claim_token()
+    assert check_and_record_messages(batch("a", "b", body="other")) == [CLAIM_CONFLICT] * 2
+
+
+def test_copies_within_a_batch_follow_the_first_occurrence():
+    assert check_and_record_messages(batch("a", "b", "a")) == [
+        CLAIM_FIRST_TIME, CLAIM_FIRST_TIME, CLAIM_DUPLICATE,
+    ]
+
+
+def test_throttle_retry_stops_at_deadline():
+    calls = []
+
+    def throttled():
+        calls.append(1)
+        raise ClientError({"Error": {"Code": "ThrottlingException", "Message": ""}}, "Op")
+
+    with pytest.raises(ClientError):
+        idempotency._call_with_throttle_retry(throttled, deadline=time.monotonic())
+    assert len(calls) == 1
+
+
+def test_claims_past_the_deadline_are_errors():
+    assert check_and_record_messages(batch("a", "b"), deadline=time.monotonic()) == [
+        CLAIM_ERROR, CLAIM_ERROR,
+    ]
+
+
+def test_completion_writes_more_than_one_batch():
+    messages = batch(*[str(i) for i in range(30)])
+    check_and_record_messages(messages)
+    mark_messages_completed(messages)
+
+    assert get_processed_record("29")["status"] == "COMPLETED"
+
+
+def unprocessed_batch_writes(monkeypatch):
+    """让 BatchWriteItem 始终原样返回全部条目（持续限流），返回调用记录"""
+    calls = []
+
+    def batch_write_item(RequestItems):
+        calls.append(RequestItems)
+        return {"UnprocessedItems": RequestItems}
+
+    monkeypatch.setattr(idempotency.dynamodb.meta.client, "batch_write_item", batch_write_item)
+    monkeypatch.setattr(idempotency.time, "sleep", lambda seconds: None)
+    return calls
+
+
+def test_unprocessed_items_are_resent_a_bounded_number_of_times(monkeypatch):
+    calls = unprocessed_batch_writes(monkeypatch)
+
+    release_message_claims(["a", "b"])
+
+    assert len(calls) == idempotency.IDEMPOTENCY_THROTTLE_RETRIES + 1
+
+
+def test_unprocessed_items_are_not_resent_past_the_deadline(monkeypatch):
+    calls = unprocessed_batch_writes(monkeypatch)
+    monkeypatch.setattr(idempotency, "_backoff_delay", lambda attempt: 1.0)
+
+    mark_messages_completed(batch("a", "b"), deadline=time.monotonic() + 0.5)
+
+    assert len(calls) == 1
@@ -0,0 +1,54 @@
+"""幂等性记录格式的测试"""
+import pytest
+
+from idempotency_records import (
+    RECORD_FORMAT_COMPACT,
+    RECORD_FORMAT_LEGACY,
+    STATUS_COMPLETED,
+    STATUS_IN_PROGRESS,
+    build_record,
+    decode_fingerprint,
+    encode_fingerprint,
+    normalize_record,
+)
+
+SHA256 = "ab" * 32
+CRC32 = "crc32:0badf00d"
+
+
+@pytest.mark.parametrize("fingerprint", [SHA256, CRC32])
+def test_fingerprint_round_trip(fingerprint):
+    assert decode_fingerprint(encode_fingerprint(fingerprint)) == fingerprint
+
+
+def test_encoded_fingerprint_is_algorithm_byte_plus_raw_digest():
+    assert encode_fingerprint(SHA256) == bytes([1]) + bytes.fromhex(SHA256)
+    assert encode_fingerprint(CRC32) == bytes([2, 0x0B, 0xAD, 0xF0, 0x0D])
+
+
+@pytest.mark.parametrize("record_format", [RECORD_FORMAT_LEGACY, RECORD_FORMAT_COMPACT])
+def test_in_progress_record_normalizes_to_legacy_fields(record_format):
+    record = build_record(
+        "req-1", CRC32, STATUS_IN_PROGRESS, now=1000.0, ttl_seconds=60,
+        lease_seconds=30, record_format=record_format, claim_token="token",
+    )
+
+    assert record["claim_token"] == "token"
+    assert normalize_record(record) == {
+        "request_id": "req-1",
+        "status": STATUS_IN_PROGRESS,
+        "processed_at": "1970-01-01T00:16:40",
+        "message_body_hash": CRC32,
+        "ttl": 1060,
+        "lease_until": 1030,
+    }
+
+
+def test_compact_completed_record_omits_status_and_lease():
+    record = build_record(
+        "req-1", None, STATUS_COMPLETED, now=1000.0, ttl_seconds=60,
+        lease_seconds=30, record_format=RECORD_FORMAT_COMPACT, claim_token="token",
+    )
+
+    assert record == {"request_id": "req-1", "t": 1000, "ttl": 1060}
+    assert normalize_record(record)["status"] == STATUS_COMPLETED
@@ -0,0 +1,179 @@
+"""共享队列负载快照存储的测试"""
+import boto3
+import pytest
+
+import queue_selector
+from load_store import (
+    DynamoDBLoadSnapshotStore,
+    InMemoryLoadSnapshotStore,
+    LoadSnapshotStore,
+)
+
+SNAPSHOT = {
+    "loads": {"us-east-1": 10, "us-west-2": 3},
+    "in_flight": {"us-east-1": 1, "us-west-2": 0},
+    "sampled_at": 1000.5,
+    "routed_totals": {"us-east-1": 42},
+}
+
+
+@pytest.fixture(params=["memory", "dynamodb"])
+def store(request, aws):
+    """两种实现遵循相同的契约"""
+    if request.param == "memory":
+        return InMemoryLoadSnapshotStore()
+
+    boto3.client("dynamodb").create_table(
+        TableName="load-snapshot",
+        KeySchema=[{"AttributeName": "snapshot_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "snapshot_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    return DynamoDBLoadSnapshotStore("load-snapshot")
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        LoadSnapshotStore()
+
+
+def test_read_returns_none_before_first_write(store):
+    assert store.read() is None
+
+
+def test_write_then_read_round_trip(store):
+    store.write(SNAPSHOT)
+    assert store.read() == SNAPSHOT
+
+
+def test_refresh_lease_is_exclusive_until_expiry(store):
+    assert store.try_acquire_refresh(now=100.0, lease_seconds=5)
+    assert not store.try_acquire_refresh(now=102.0, lease_seconds=5)
+    assert store.try_acquire_refresh(now=106.0, lease_seconds=5)
+
+
+def test_write_releases_lease(store):
+    assert store.try_acquire_refresh(now=100.0, lease_seconds=5)
+    store.write(SNAPSHOT)
+    assert store.try_acquire_refresh(now=101.0, lease_seconds=5)
+
+
+def test_routed_counters_accumulate_across_containers(store):
+    assert store.routed_totals() == {}
+
+    store.add_routed({"us-east-1": 5, "us-west-2": 2})
+    store.add_routed({"us-east-1": 3, "us-west-2": -2})
+
+    assert store.routed_totals() == {"us-east-1": 8, "us-west-2": 0}
+
+
+def test_routed_counters_survive_snapshot_writes(store):
+    store.add_routed({"us-east-1": 5})
+    store.write(SNAPSHOT)
+    store.add_routed({"us-east-1": 1})
+
+    assert store.routed_totals() == {"us-east-1": 6}
+    assert store.read()["routed_totals"] == SNAPSHOT["routed_totals"]
+
+
+@pytest.fixture
+def shared_selector(monkeypatch):
+    """使用进程内快照存储的 queue_selector，并记录 SQS 采样次数"""
+    memory_store = InMemoryLoadSnapshotStore()
+    monkeypatch.setattr(queue_selector, "load_snapshot_store", memory_store)
+    monkeypatch.setattr(queue_selector, "queue_load_cache", {})
+    monkeypatch.setattr(queue_selector, "queue_in_flight", {})
+    monkeypatch.setattr(queue_selector, "drain_rates", {})
+    monkeypatch.setattr(queue_selector, "routed_since_refresh", {})
+    monkeypatch.setattr(queue_selector, "_unflushed_routed", {})
+    monkeypatch.setattr(queue_selector, "last_routed_totals", None)
+    monkeypatch.setattr(queue_selector, "cache_timestamp", 0.0)
+    monkeypatch.setattr(queue_selector, "sample_timestamp", 0.0)
+
+    samples = []
+
+    def fake_sample():
+        samples.append(1)
+        loads = {"us-east-1": 7, "us-west-2": 2, "eu-west-1": 4}
+        return loads, {region: 0 for region in loads}, set(loads)
+
+    monkeypatch.setattr(queue_selector, "_sample_queue_attributes", fake_sample)
+    return memory_store, samples
+
+
+def test_fresh_shared_snapshot_is_used_without_sampling(shared_selector):
+    memory_store, samples = shared_selector
+    memory_store.write({
+        "loads": {"us-east-1": 1, "us-west-2": 2, "eu-west-1": 3},
+        "in_flight": {"us-east-1": 0, "us-west-2": 0, "eu-west-1": 0},
+        "sampled_at": queue_selector.time.time(),
+    })
+
+    loads = queue_selector.refresh_queue_loads()
+
+    assert loads == {"us-east-1": 1, "us-west-2": 2, "eu-west-1": 3}
+    assert samples == []
+
+
+def test_lease_holder_samples_and_publishes_snapshot(shared_selector):
+    memory_store, samples = shared_selector
+
+    loads = queue_selector.refresh_queue_loads()
+
+    assert samples == [1]
+    assert memory_store.read()["loads"] == loads
+
+
+def test_other_container_refreshing_reuses_stale_snapshot(shared_selector):
+    memory_store, samples = shared_selector
+    stale = {
+        "loads": {"us-east-1": 5, "us-west-2": 5, "eu-west-1": 5},
+        "in_flight": {"us-east-1": 0, "us-west-2": 0, "eu-west-1": 0},
+        "sampled_at": queue_selector.time.time() - 10 * queue_selector.CACHE_TTL,
+    }
+    memory_store.write(stale)
+    assert memory_store.try_acquire_refresh(queue_selector.time.time(), 60)
+
+    loads = queue_selector.refresh_queue_loads()
+
+    assert samples == []
+    assert loads == stale["loads"]
+
+
+def test_lease_holder_flushes_and_records_fleet_routed_totals(shared_selector):
+    memory_store, _ = shared_selector
+    queue_selector.record_routed("us-west-2", 4)
+    memory_store.add_routed({"us-west-2": 6})
+
+    queue_selector.refresh_queue_loads()
+
+    assert memory_store.read()["routed_totals"] == {"us-west-2": 10}
+
+
+def _snapshot(backlog, sampled_at, routed_totals):
+    regions = ("us-east-1", "us-west-2", "eu-west-1")
+    return {
+        "loads": {region: backlog for region in regions},
+        "in_flight": {region: 0 for region in regions},
+        "sampled_at": sampled_at,
+        "routed_totals": routed_totals,
+    }
+
+
+def test_drain_rate_counts_arrivals_from_all_containers(shared_selector):
+    # 本容器没有向 us-east-1 路由任何消息，其他容器在 10 秒内路由了 50 条，
+    # 积压不变，说明该 Region 每秒消费 5 条
+    queue_selector._apply_snapshot(_snapshot(100, 1000.0, {"us-east-1": 200}))
+    queue_selector._apply_snapshot(_snapshot(100, 1010.0, {"us-east-1": 250}))
+
+    assert queue_selector.drain_rates["us-east-1"] == pytest.approx(5.0)
+    assert queue_selector.drain_rates["us-west-2"] == pytest.approx(0.0)
+
+
+def test_drain_rate_not_updated_without_fleet_totals(shared_selector):
+    queue_selector._apply_snapshot(_snapshot(100, 1000.0, {"us-east-1": 200}))
+    old_format = _snapshot(50, 1010.0, {})
+    del old_format["routed_totals"]
+    queue_selector._apply_snapshot(old_format)
+
+    assert queue_selector.drain_rates == {}
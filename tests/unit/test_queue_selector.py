@@ -0,0 +1,184 @@
+"""队列负载缓存刷新（stale-while-revalidate）、路由负载计数和熔断探测路由的测试"""
+import threading
+import time
+
+import pytest
+
+import queue_selector
+
+LOADS = {"us-east-1": 7, "us-west-2": 2, "eu-west-1": 4}
+
+
+class FakeSampler:
+    """代替 SQS 采样：记录采样次数，可以在采样中途阻塞"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        assert self.release.wait(timeout=5)
+        return dict(LOADS), {region: 0 for region in LOADS}, set(LOADS)
+
+
+@pytest.fixture
+def sampler(monkeypatch):
+    """不使用共享快照的 queue_selector，缓存为空"""
+    monkeypatch.setattr(queue_selector, "load_snapshot_store", None)
+    monkeypatch.setattr(queue_selector, "queue_load_cache", {})
+    monkeypatch.setattr(queue_selector, "queue_in_flight", {})
+    monkeypatch.setattr(queue_selector, "drain_rates", {})
+    monkeypatch.setattr(queue_selector, "routed_since_refresh", {})
+    monkeypatch.setattr(queue_selector, "last_routed_totals", None)
+    monkeypatch.setattr(queue_selector, "cache_timestamp", 0.0)
+    monkeypatch.setattr(queue_selector, "sample_timestamp", 0.0)
+    monkeypatch.setattr(queue_selector, "_refresh_in_flight", False)
+    monkeypatch.setattr(queue_selector, "CACHE_TTL", 10)
+    monkeypatch.setattr(queue_selector, "CACHE_MAX_STALENESS", 60)
+    monkeypatch.setattr(queue_selector, "ROUTED_LOAD_ACCOUNTING", True)
+    monkeypatch.setattr(
+        queue_selector, "circuit_breakers", queue_selector.RegionCircuitBreakers(3, 30)
+    )
+
+    fake = FakeSampler()
+    monkeypatch.setattr(queue_selector, "_sample_queue_attributes", fake)
+    return fake
+
+
+def age_cache(seconds):
+    queue_selector.cache_timestamp = queue_selector.time.time() - seconds
+
+
+def wait_for_background_refresh():
+    with queue_selector._refresh_lock:
+        assert queue_selector._refresh_done.wait_for(
+            lambda: not queue_selector._refresh_in_flight, timeout=5
+        )
+
+
+def test_fresh_cache_is_used_without_sampling(sampler):
+    queue_selector.get_queue_loads()
+    queue_selector.get_queue_loads()
+
+    assert sampler.calls == 1
+
+
+def test_stale_cache_is_served_while_refreshing_in_background(sampler):
+    stale = {"us-east-1": 100, "us-west-2": 100, "eu-west-1": 100}
+    queue_selector.queue_load_cache = stale
+    age_cache(30)
+    sampler.release.clear()
+
+    assert queue_selector.get_queue_loads() is stale
+    assert sampler.started.wait(timeout=5)
+
+    sampler.release.set()
+    wait_for_background_refresh()
+    assert queue_selector.queue_load_cache == LOADS
+
+
+def test_synchronous_refresh_waits_for_the_background_refresh(sampler):
+    queue_selector.queue_load_cache = {"us-east-1": 100, "us-west-2": 100, "eu-west-1": 100}
+    age_cache(30)
+    sampler.release.clear()
+    queue_selector.get_queue_loads()
+    assert sampler.started.wait(timeout=5)
+
+    # 后台刷新尚未完成时缓存超过最大陈旧时间，同步路径等待后台刷新的结果
+    queue_selector.record_routed("us-west-2", 5)
+    age_cache(90)
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(queue_selector.get_queue_loads()))
+    waiter.start()
+    time.sleep(0.1)
+    sampler.release.set()
+    waiter.join(timeout=5)
+
+    assert results == [LOADS]
+    assert sampler.calls == 1
+    # 后台采样开始之后路由的消息保留到下一次刷新，不会被第二次刷新扣掉
+    assert queue_selector.routed_since_refresh == {"us-west-2": 5}
+
+
+def test_routed_messages_are_added_to_cached_depth(sampler):
+    queue_selector.get_queue_loads()
+    queue_selector.record_routed("us-west-2", 3)
+
+    assert queue_selector.get_effective_queue_loads() == {**LOADS, "us-west-2": 5}
+
+
+def test_routed_load_accounting_can_be_disabled(sampler, monkeypatch):
+    monkeypatch.setattr(queue_selector, "ROUTED_LOAD_ACCOUNTING", False)
+    queue_selector.get_queue_loads()
+    queue_selector.record_routed("us-west-2", 3)
+
+    assert queue_selector.get_effective_queue_loads() == LOADS
+
+
+def test_refresh_drops_messages_routed_before_sampling(sampler):
+    queue_selector.record_routed("us-west-2", 3)
+
+    queue_selector.get_queue_loads(force_refresh=True)
+
+    assert queue_selector.routed_since_refresh == {}
+    assert queue_selector.get_effective_queue_loads() == LOADS
+
+
+def test_batch_routing_records_every_routed_message(sampler):
+    targets = queue_selector.get_target_queue_urls(20)
+
+    assert sum(queue_selector.routed_since_refresh.values()) == 20
+    for region, count in queue_selector.routed_since_refresh.items():
+        assert [target[0] for target in targets].count(region) == count
+
+
+def routed_regions(count):
+    return [region for region, _ in queue_selector.get_target_queue_urls(count)]
+
+
+@pytest.fixture
+def clock(sampler, monkeypatch):
+    """使用可控时钟的熔断器（失败阈值 3，30 秒后进入半开）"""
+    now = [1000.0]
+    monkeypatch.setattr(
+        queue_selector,
+        "circuit_breakers",
+        queue_selector.RegionCircuitBreakers(3, 30, clock=lambda: now[0]),
+    )
+    monkeypatch.setattr(queue_selector, "CIRCUIT_PROBE_SHARE", 0.1)
+    return now
+
+
+def open_circuit(region):
+    for _ in range(3):
+        queue_selector.record_region_failure(region)
+
+
+def test_open_region_gets_no_traffic(clock):
+    open_circuit("us-east-1")
+
+    assert "us-east-1" not in routed_regions(20)
+
+
+def test_half_open_region_gets_a_single_probe_share(clock):
+    open_circuit("us-east-1")
+    clock[0] += 31
+
+    assert routed_regions(20).count("us-east-1") == 2
+    # 探测尚未返回结果时不再发送新的探测
+    assert "us-east-1" not in routed_regions(20)
+
+
+def test_successful_probe_restores_normal_routing(clock):
+    open_circuit("us-east-1")
+    clock[0] += 31
+    routed_regions(20)
+
+    queue_selector.record_region_success("us-east-1")
+
+    assert queue_selector.circuit_breakers.state("us-east-1") == queue_selector.STATE_CLOSED
+    assert queue_selector.get_available_queues(LOADS) == LOADS
@@ -0,0 +1,32 @@
+"""路由策略的测试"""
+import random
+from collections import Counter
+
+import pytest
+
+from routing_strategies import apportion
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 100, 1000])
+def test_apportion_assigns_every_message(count):
+    weights = {"us-east-1": 0.5, "us-west-2": 0.3, "eu-west-1": 0.2}
+    assert len(apportion(weights, count)) == count
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_apportion_stays_within_one_message_of_each_quota(seed):
+    random.seed(seed)
+    weights = {"us-east-1": 0.45, "us-west-2": 0.35, "eu-west-1": 0.2}
+    counts = Counter(apportion(weights, 13))
+
+    for region, weight in weights.items():
+        assert abs(counts[region] - weight * 13) < 1
+
+
+def test_apportion_is_exact_for_whole_quotas():
+    weights = {"us-east-1": 0.75, "us-west-2": 0.25}
+    assert Counter(apportion(weights, 8)) == {"us-east-1": 6, "us-west-2": 2}
+
+
+def test_apportion_single_region_takes_everything():
+    assert apportion({"us-east-1": 1.0}, 5) == ["us-east-1"] * 5